@@ -4,7 +4,6 @@ from analyze.api_utils import (
     clear_task_history_user,
     create_new_tasks,
     get_tasks_by_user_token,
-    process_data,
     send_task_email,
 )
 from analyze.schemas import (
@@ -12,7 +11,8 @@ from analyze.schemas import (
     AnalyzeUrlResponse,
 )
 from api.utils import get_current_token
-from celery_app import start_analysis_task
+from celery import chain
+from celery_app import ingest_url_task, start_analysis_task
 from db.dependencies import get_db
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
@@ -27,13 +27,13 @@ async def analyze_url(
     token: str = Depends(get_current_token),
 ) -> AnalyzeUrlResponse:
     task_ids: Dict[str, str] = {}
-    ks_validators_dict = process_data(request.urls)
-    for url, page_data in ks_validators_dict.items():
-        task = start_analysis_task.delay(
-            page_data.model_dump(), request.validate_params, url
-        )
+    for url in request.urls:
+        task = chain(
+            ingest_url_task.s(url),
+            start_analysis_task.s(request.validate_params, url),
+        ).apply_async()
         task_ids[url] = task.id
-    create_new_tasks(ks_validators_dict, task_ids, db, token)
+    create_new_tasks(request.urls, task_ids, db, token)
     return AnalyzeUrlResponse(task_ids=task_ids, status="processing")
 
 
@@ -1,38 +1,27 @@
 import json
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Iterable
 
-from analyze.schemas import KSAttributes
-from analyze.scraper import FilesProcessor, ParserWeb
 from auth.utils import send_task_to_user_email
 from celery.result import AsyncResult
 from db.models import TaskHistory, User
 from sqlalchemy.orm import Session
 
 
-def process_data(urls):
-    ks_validators_dict = {}
-    for url in urls:
-        page_data = ParserWeb(url).fetch_and_parse()
-        page_data = FilesProcessor().generate_parsed_files_data(page_data)
-        ks_validators_dict[url] = page_data
-    return ks_validators_dict
-
-
 def create_new_tasks(
-    ks_validators_dict: Dict[str, KSAttributes],
+    urls: Iterable[str],
     task_ids: Dict[str, str],
     db: Session,
     token: str,
 ):
     user = db.query(User).filter(User.token == token).first()
 
-    for url, attributes in ks_validators_dict.items():
+    for url in urls:
         new_task = TaskHistory(
             user_id=user.id,
             ids=task_ids[url],
             url=url,
-            description=attributes.name,
+            description=url,
             status="PENDING",
         )
         db.add(new_task)
@@ -49,6 +38,9 @@ async def process_task(user_id: int, db: Session):
         if task_result.state == "SUCCESS" and not task.completed_at:
             result = json.dumps(task_result.result)
             task.result = result
+            task.description = (
+                task_result.result.get("name") or task.description
+            )
             task.completed_at = datetime.now()
         task.status = task_result.state
         db.commit()
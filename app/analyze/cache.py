@@ -0,0 +1,239 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, Optional
+
+import redis
+from config import settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    content_hash TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS file_ids (
+    file_id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_last_access
+    ON documents (last_access);
+"""
+
+
+class ParsedDocumentCache:
+    """
+    Кэш разобранных документов в SQLite.
+
+    Документ (ParsedDocument в JSON) хранится по хешу содержимого файла,
+    идентификатор файла в FileStorage ссылается на этот хеш. Попадание по
+    идентификатору позволяет не скачивать файл, попадание по хешу - не
+    разбирать его. Суммарный размер записей ограничен `max_bytes`, при превышении
+    вытесняются давно не использованные документы.
+    """
+
+    def __init__(self, path: str, max_bytes: int) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connection() as connection:
+            connection.executescript(SCHEMA)
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield connection
+            connection.commit()
+        finally:
+            connection.close()
+
+    def _touch(self, connection: sqlite3.Connection, digest: str) -> None:
+        connection.execute(
+            "UPDATE documents SET last_access = ? WHERE content_hash = ?",
+            (time.time(), digest),
+        )
+
+    def get_by_hash(self, digest: str) -> Optional[str]:
+        with self._lock, self._connection() as connection:
+            row = connection.execute(
+                "SELECT text FROM documents WHERE content_hash = ?",
+                (digest,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._touch(connection, digest)
+            return row[0]
+
+    def get_by_file_id(self, file_id: Optional[str]) -> Optional[str]:
+        if file_id is None:
+            return None
+        with self._lock, self._connection() as connection:
+            row = connection.execute(
+                "SELECT documents.content_hash, documents.text "
+                "FROM file_ids JOIN documents "
+                "ON documents.content_hash = file_ids.content_hash "
+                "WHERE file_ids.file_id = ?",
+                (str(file_id),),
+            ).fetchone()
+            if row is None:
+                return None
+            self._touch(connection, row[0])
+            return row[1]
+
+    def link(self, file_id: Optional[str], digest: str) -> None:
+        if file_id is None:
+            return
+        with self._lock, self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO file_ids (file_id, content_hash) "
+                "VALUES (?, ?)",
+                (str(file_id), digest),
+            )
+
+    def put(
+        self, digest: str, text: str, file_id: Optional[str] = None
+    ) -> None:
+        size = len(text.encode())
+        if size > self.max_bytes:
+            return
+        with self._lock, self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO documents "
+                "(content_hash, text, size, last_access) VALUES (?, ?, ?, ?)",
+                (digest, text, size, time.time()),
+            )
+            if file_id is not None:
+                connection.execute(
+                    "INSERT OR REPLACE INTO file_ids (file_id, content_hash) "
+                    "VALUES (?, ?)",
+                    (str(file_id), digest),
+                )
+            self._evict(connection)
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        (total,) = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM documents"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        rows = connection.execute(
+            "SELECT content_hash, size FROM documents ORDER BY last_access"
+        ).fetchall()
+        evicted = []
+        for digest, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((digest,))
+            total -= size
+        connection.executemany(
+            "DELETE FROM documents WHERE content_hash = ?", evicted
+        )
+        connection.executemany(
+            "DELETE FROM file_ids WHERE content_hash = ?", evicted
+        )
+
+
+class AuctionMetadataCache:
+    """
+    Кэш ответа Auction/Get по идентификатору закупки.
+
+    Запись содержит скелет KSAttributes (без разобранных файлов), ETag и
+    Last-Modified ответа и время получения. Запись моложе `ttl` считается
+    свежей, устаревшая хранится ещё `max_age` секунд для условной
+    перепроверки. При заданном `redis_url` кэш общий для всех воркеров,
+    иначе хранится в памяти процесса.
+    """
+
+    KEY = "ks:auction:{auction_id}"
+
+    def __init__(
+        self,
+        ttl: float,
+        max_age: float,
+        redis_url: Optional[str] = None,
+        max_entries: int = 1024,
+    ) -> None:
+        self.ttl = ttl
+        self.max_age = max(ttl, max_age)
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = redis.Redis.from_url(redis_url) if redis_url else None
+
+    def get(self, auction_id: str) -> Optional[dict]:
+        if self._redis is not None:
+            raw = self._redis.get(self.KEY.format(auction_id=auction_id))
+            return json.loads(raw) if raw else None
+        with self._lock:
+            entry = self._entries.get(auction_id)
+            if entry is None:
+                return None
+            if time.time() - entry["fetched_at"] >= self.max_age:
+                del self._entries[auction_id]
+                return None
+            self._entries.move_to_end(auction_id)
+            return entry
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    def put(
+        self,
+        auction_id: str,
+        attributes: dict,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        self._store(
+            auction_id,
+            {
+                "attributes": attributes,
+                "etag": etag,
+                "last_modified": last_modified,
+                "fetched_at": time.time(),
+            },
+        )
+
+    def touch(self, auction_id: str, entry: dict) -> None:
+        """Продлевает свежесть записи после ответа 304 Not Modified."""
+        self._store(auction_id, {**entry, "fetched_at": time.time()})
+
+    def _store(self, auction_id: str, entry: dict) -> None:
+        if self._redis is not None:
+            self._redis.set(
+                self.KEY.format(auction_id=auction_id),
+                json.dumps(entry),
+                ex=int(self.max_age),
+            )
+            return
+        with self._lock:
+            self._entries[auction_id] = entry
+            self._entries.move_to_end(auction_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+@lru_cache(maxsize=None)
+def get_auction_metadata_cache() -> AuctionMetadataCache:
+    return AuctionMetadataCache(
+        settings.AUCTION_CACHE_TTL,
+        settings.AUCTION_CACHE_MAX_AGE,
+        settings.AUCTION_CACHE_REDIS_URL,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_parsed_document_cache() -> Optional[ParsedDocumentCache]:
+    if not settings.PARSED_CACHE_PATH:
+        return None
+    return ParsedDocumentCache(
+        settings.PARSED_CACHE_PATH, settings.PARSED_CACHE_MAX_BYTES
+    )
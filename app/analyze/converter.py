@@ -0,0 +1,327 @@
+import atexit
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import List, Optional
+
+from config import settings
+
+try:
+    import uno
+except ImportError:
+    # pyuno ставится пакетом python3-uno в системный site-packages,
+    # добавляем его в конец пути, чтобы не перекрывать пакеты из pip
+    sys.path.append(settings.UNO_PATH)
+    try:
+        import uno
+    except ImportError:
+        uno = None
+
+
+def convert_to_pdf(
+    input_path: str, profile_dir: Optional[str] = None
+) -> tuple:
+    """
+    Converts DOC to PDF using LibreOffice.
+    The PDF is written next to the input file. LibreOffice runs with its own
+    user profile (next to the input by default), so parallel conversions do
+    not lock each other out.
+    Returns path to the generated PDF.
+    """
+    input_path = Path(input_path)
+    if not input_path.exists():
+        raise FileNotFoundError(f"Input file not found: {input_path}")
+
+    output_dir = input_path.parent
+    profile_dir = Path(
+        profile_dir or output_dir / f".lo_profile_{input_path.stem}"
+    )
+
+    subprocess.run(
+        [
+            "soffice",
+            f"-env:UserInstallation={profile_dir.resolve().as_uri()}",
+            "--headless",
+            "--convert-to",
+            "pdf",
+            str(input_path),
+            "--outdir",
+            str(output_dir),
+        ],
+        timeout=settings.CONVERSION_TIMEOUT,
+    )
+
+    pdf_path = output_dir / f"{input_path.stem}.pdf"
+    return (str(pdf_path) if pdf_path.exists() else None), pdf_path
+
+
+def _property(name: str, value):
+    prop = uno.createUnoStruct("com.sun.star.beans.PropertyValue")
+    prop.Name = name
+    prop.Value = value
+    return prop
+
+
+class OfficeWorker:
+    """
+    Долгоживущий процесс soffice, принимающий UNO-соединения через
+    именованный канал. Каждый воркер работает со своим профилем, поэтому
+    несколько воркеров (и несколько процессов Celery) не мешают друг другу.
+    """
+
+    def __init__(self, index: int) -> None:
+        self.pipe_name = f"ks_office_{os.getpid()}_{index}"
+        self.profile_dir = Path(tempfile.mkdtemp(prefix=f"{self.pipe_name}_"))
+        self.process: Optional[subprocess.Popen] = None
+        self.desktop = None
+        self.job_started: Optional[float] = None
+        # Держится на время задания или перезапуска этого воркера
+        self.lock = threading.Lock()
+
+    def start(self) -> None:
+        self.process = subprocess.Popen(
+            [
+                "soffice",
+                f"-env:UserInstallation={self.profile_dir.as_uri()}",
+                "--headless",
+                "--invisible",
+                "--nologo",
+                "--norestore",
+                f"--accept=pipe,name={self.pipe_name};urp;",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local_context
+        )
+        deadline = time.monotonic() + settings.CONVERSION_START_TIMEOUT
+        while True:
+            try:
+                context = resolver.resolve(
+                    f"uno:pipe,name={self.pipe_name};urp;"
+                    "StarOffice.ComponentContext"
+                )
+                break
+            except Exception:
+                if time.monotonic() > deadline or not self.is_running():
+                    self.stop()
+                    raise RuntimeError("soffice did not start in time")
+                time.sleep(0.2)
+        self.desktop = context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.frame.Desktop", context
+        )
+
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def is_healthy(self) -> bool:
+        if not self.is_running() or self.desktop is None:
+            return False
+        try:
+            self.desktop.getFrames()
+            return True
+        except Exception:
+            return False
+
+    def stop(self) -> None:
+        if self.is_running():
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+        self.desktop = None
+
+    def restart(self) -> None:
+        self.stop()
+        self.start()
+
+    def convert(self, input_path: Path, output_path: Path) -> None:
+        document = self.desktop.loadComponentFromURL(
+            input_path.resolve().as_uri(),
+            "_blank",
+            0,
+            (_property("Hidden", True),),
+        )
+        try:
+            document.storeToURL(
+                output_path.resolve().as_uri(),
+                (_property("FilterName", "writer_pdf_Export"),),
+            )
+        finally:
+            document.close(True)
+
+
+class ConversionPool:
+    """
+    Пул долгоживущих конвертеров DOC -> PDF.
+
+    Задания ставятся в общую очередь и разбираются потоками, по одному на
+    процесс soffice. Поток наблюдения раз в секунду проверяет процессы:
+    упавший или не отвечающий soffice перезапускается, а задание дольше
+    `timeout` секунд прерывается перезапуском своего процесса. Время
+    ожидания в очереди в `timeout` не входит.
+    """
+
+    def __init__(self, workers: int, timeout: float) -> None:
+        self.timeout = timeout
+        self.jobs: queue.Queue = queue.Queue()
+        self.workers: List[OfficeWorker] = []
+        self.closed = False
+        self._lock = threading.Lock()
+        try:
+            for index in range(workers):
+                worker = OfficeWorker(index)
+                self.workers.append(worker)
+                worker.start()
+        except Exception:
+            self.close()
+            raise
+        for worker in self.workers:
+            threading.Thread(
+                target=self._serve, args=(worker,), daemon=True
+            ).start()
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def _serve(self, worker: OfficeWorker) -> None:
+        while not self.closed:
+            input_path, output_path, future, started = self.jobs.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            # Перезапуск (до CONVERSION_START_TIMEOUT секунд) идёт под
+            # блокировкой воркера, а не пула: остальные воркеры и поток
+            # наблюдения его не ждут
+            with worker.lock:
+                if not worker.is_healthy():
+                    self._restart(worker)
+                with self._lock:
+                    worker.job_started = time.monotonic()
+                started.set()
+                try:
+                    if worker.is_healthy():
+                        worker.convert(input_path, output_path)
+                    else:
+                        # soffice не перезапустился: конвертируем разовым
+                        # запуском, а не отклоняем задания
+                        output_path = convert_to_pdf(str(input_path))[1]
+                    future.set_result(output_path)
+                except Exception as error:
+                    future.set_exception(error)
+                with self._lock:
+                    worker.job_started = None
+                if not worker.is_healthy():
+                    self._restart(worker)
+
+    def _watch(self) -> None:
+        while not self.closed:
+            time.sleep(1)
+            for worker in self.workers:
+                with self._lock:
+                    if self.closed:
+                        return
+                    started = worker.job_started
+                    if started is not None:
+                        if time.monotonic() - started > self.timeout:
+                            # Убитый soffice прерывает зависший UNO-вызов,
+                            # после чего поток воркера перезапустит процесс
+                            worker.stop()
+                        continue
+                # Свободный воркер перезапускается, только если его поток
+                # не взял задание (тогда перезапустит сам)
+                if worker.lock.acquire(blocking=False):
+                    try:
+                        if not worker.is_healthy():
+                            self._restart(worker)
+                    finally:
+                        worker.lock.release()
+
+    @staticmethod
+    def _restart(worker: OfficeWorker) -> None:
+        try:
+            worker.restart()
+        except Exception as error:
+            print(error)
+
+    def health(self) -> List[bool]:
+        return [worker.is_healthy() for worker in self.workers]
+
+    def convert(self, input_path: str) -> Path:
+        input_path = Path(input_path)
+        output_path = input_path.with_suffix(".pdf")
+        future: Future = Future()
+        started = threading.Event()
+        with self._lock:
+            if self.closed:
+                raise RuntimeError("conversion pool is closed")
+            self.jobs.put((input_path, output_path, future, started))
+        try:
+            # Отсчёт таймаута начинается, когда воркер взял задание
+            started.wait()
+            return future.result(timeout=self.timeout + 5)
+        finally:
+            # Задание, которое ещё ждёт в очереди, не должно запуститься
+            # после ухода вызывающего: его каталог уже может быть удалён
+            future.cancel()
+
+    def close(self) -> None:
+        with self._lock:
+            self.closed = True
+            while True:
+                try:
+                    _, _, future, started = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                future.cancel()
+                started.set()
+            for worker in self.workers:
+                worker.stop()
+                shutil.rmtree(worker.profile_dir, ignore_errors=True)
+
+
+_pool: Optional[ConversionPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_conversion_pool() -> Optional[ConversionPool]:
+    """
+    Общий для процесса пул конвертеров.
+
+    None, если пул выключен (CONVERSION_WORKERS = 0), pyuno недоступен или
+    soffice не удалось запустить - тогда используется convert_to_pdf.
+    """
+    global _pool, _pool_pid
+    if uno is None or settings.CONVERSION_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool_pid != os.getpid():
+            _pool_pid = os.getpid()
+            try:
+                _pool = ConversionPool(
+                    settings.CONVERSION_WORKERS, settings.CONVERSION_TIMEOUT
+                )
+                atexit.register(shutdown_conversion_pool)
+            except Exception as error:
+                print(error)
+                _pool = None
+        return _pool
+
+
+def shutdown_conversion_pool() -> None:
+    """
+    Останавливает процессы soffice пула текущего процесса и удаляет их
+    профили. Вызывается при выходе и по сигналу worker_process_shutdown
+    Celery: дочерние процессы prefork завершаются без atexit.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+            _pool = None
@@ -0,0 +1,139 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+from collections.abc import Sequence
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from analyze.schemas import DocumentRef, KSAttributes, ParsedDocument
+from config import settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    content_hash TEXT PRIMARY KEY,
+    payload BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_stored_at ON documents (stored_at);
+"""
+
+
+class DocumentStore:
+    """
+    Общее для воркеров хранилище разобранных документов (claim check).
+
+    Задача разбора кладёт документы сюда и передаёт через брокер только
+    ссылки DocumentRef, задача анализа читает документы по хешу. Документы
+    хранятся сжатым JSON, одинаковые документы - в одном экземпляре.
+    Записи старше `ttl` секунд удаляются при очередной записи.
+    """
+
+    def __init__(self, path: str, ttl: float) -> None:
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connection() as connection:
+            connection.executescript(SCHEMA)
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield connection
+            connection.commit()
+        finally:
+            connection.close()
+
+    def put(self, document: ParsedDocument) -> DocumentRef:
+        data = document.model_dump_json().encode()
+        digest = hashlib.sha256(data).hexdigest()
+        payload = zlib.compress(data, 1)
+        now = time.time()
+        with self._lock, self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO documents "
+                "(content_hash, payload, size, stored_at) VALUES (?, ?, ?, ?)",
+                (digest, payload, len(data), now),
+            )
+            connection.execute(
+                "DELETE FROM documents WHERE stored_at < ?", (now - self.ttl,)
+            )
+        return DocumentRef(
+            file_name=document.file_name,
+            role=document.role,
+            content_hash=digest,
+            size=len(data),
+        )
+
+    def get(self, digest: str) -> Optional[ParsedDocument]:
+        with self._lock, self._connection() as connection:
+            row = connection.execute(
+                "SELECT payload FROM documents WHERE content_hash = ?",
+                (digest,),
+            ).fetchone()
+        if row is None:
+            return None
+        return ParsedDocument.model_validate_json(zlib.decompress(row[0]))
+
+    def load(self, ref: DocumentRef) -> ParsedDocument:
+        document = self.get(ref.content_hash)
+        if document is None:
+            raise LookupError(f"Документ {ref.file_name} не найден")
+        return document
+
+    def store(self, page_data: KSAttributes) -> KSAttributes:
+        """Сохраняет документы закупки и заменяет их ссылками."""
+        return page_data.model_copy(
+            update={
+                "documents": [],
+                "document_refs": [
+                    self.put(document) for document in page_data.documents
+                ],
+            }
+        )
+
+    def attach(self, page_data: KSAttributes) -> KSAttributes:
+        """Подставляет вместо ссылок документы, читаемые при обращении."""
+        if page_data.document_refs and not page_data.documents:
+            page_data.documents = StoredDocuments(
+                page_data.document_refs, self
+            )
+        return page_data
+
+
+class StoredDocuments(Sequence):
+    """
+    Список документов закупки, читаемых из DocumentStore при первом
+    обращении. Валидатор, нашедший ответ в первом документе, не читает
+    остальные.
+    """
+
+    def __init__(self, refs: List[DocumentRef], store: DocumentStore) -> None:
+        self.refs = refs
+        self.store = store
+        self._documents: List[Optional[ParsedDocument]] = [None] * len(refs)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.refs)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        with self._lock:
+            if self._documents[index] is None:
+                self._documents[index] = self.store.load(self.refs[index])
+            return self._documents[index]
+
+
+@lru_cache(maxsize=None)
+def get_document_store() -> DocumentStore:
+    return DocumentStore(
+        settings.DOCUMENT_STORE_PATH, settings.DOCUMENT_STORE_TTL
+    )
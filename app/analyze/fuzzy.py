@@ -0,0 +1,36 @@
+"""
+Нечёткое сравнение строки с набором окон текста одним вызовом rapidfuzz.
+
+process.cdist считает partial_ratio для всех окон сразу в C++ и в
+нескольких потоках, без цикла Python по каждому окну.
+"""
+
+from typing import List, Optional, Tuple
+
+from config import settings
+from rapidfuzz import fuzz, process
+
+
+def best_match(
+    query: str, windows: List[str], score_cutoff: int = 0
+) -> Tuple[Optional[int], int]:
+    """
+    Окно, наиболее похожее на query (fuzz.partial_ratio без учёта регистра).
+
+    Возвращает (индекс окна, оценка 0-100); индекс None, если окон нет
+    или ни одно не набрало score_cutoff.
+    """
+    if not windows:
+        return None, 0
+    scores = process.cdist(
+        [query.lower()],
+        [window.lower() for window in windows],
+        scorer=fuzz.partial_ratio,
+        score_cutoff=score_cutoff,
+        workers=settings.FUZZY_WORKERS,
+    )[0]
+    index = int(scores.argmax())
+    score = round(float(scores[index]))
+    if score == 0 or score < score_cutoff:
+        return None, score
+    return index, score
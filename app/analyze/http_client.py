@@ -0,0 +1,186 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import Awaitable, Optional, TypeVar
+
+import httpx
+import requests
+from config import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# POST не повторяется: каждый повтор запроса к LLM после таймаута чтения
+# снова ждал бы HTTP_READ_TIMEOUT. Ошибки соединения повторяются для всех
+# методов - запрос ещё не отправлен.
+RETRY_METHODS = frozenset({"GET", "HEAD"})
+
+T = TypeVar("T")
+
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+_session_lock = threading.Lock()
+_async_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_pid: Optional[int] = None
+_loop_lock = threading.Lock()
+
+
+class PooledSession(requests.Session):
+    """requests.Session, подставляющая таймауты по умолчанию."""
+
+    def __init__(self, timeout: tuple) -> None:
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def _timeout() -> tuple:
+    return settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT
+
+
+def _retry() -> Retry:
+    return Retry(
+        total=settings.HTTP_RETRIES,
+        backoff_factor=settings.HTTP_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=RETRY_METHODS,
+        raise_on_status=False,
+    )
+
+
+def build_session() -> requests.Session:
+    """
+    Создание сессии с keep-alive пулами, таймаутами и повторами.
+
+    Размер пула задаётся для каждого хоста из HTTP_HOST_POOL_SIZES,
+    для остальных хостов используется HTTP_POOL_SIZE.
+    """
+    session = PooledSession(_timeout())
+    default_adapter = HTTPAdapter(
+        pool_maxsize=settings.HTTP_POOL_SIZE, max_retries=_retry()
+    )
+    session.mount("http://", default_adapter)
+    session.mount("https://", default_adapter)
+    for host, pool_size in settings.HTTP_HOST_POOL_SIZES.items():
+        adapter = HTTPAdapter(pool_maxsize=pool_size, max_retries=_retry())
+        session.mount(f"http://{host}", adapter)
+        session.mount(f"https://{host}", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Общая для процесса синхронная сессия.
+
+    После fork (воркеры Celery) создаётся новая сессия, чтобы процессы
+    не делили сокеты родителя.
+    """
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            _session = build_session()
+            _session_pid = os.getpid()
+        return _session
+
+
+def build_async_client() -> httpx.AsyncClient:
+    """
+    Асинхронный клиент с пулами по хостам. Транспорты не повторяют
+    соединения сами: повторы и задержки делает только arequest.
+    """
+    timeout = httpx.Timeout(
+        settings.HTTP_READ_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT
+    )
+    mounts = {
+        f"all://{host}": httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+            ),
+        )
+        for host, pool_size in settings.HTTP_HOST_POOL_SIZES.items()
+    }
+    return httpx.AsyncClient(
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_POOL_SIZE,
+            max_keepalive_connections=settings.HTTP_POOL_SIZE,
+        ),
+        mounts=mounts,
+    )
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Общий асинхронный клиент для текущего event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = build_async_client()
+        _async_clients[loop] = client
+    return client
+
+
+async def arequest(
+    method: str,
+    url: str,
+    client: Optional[httpx.AsyncClient] = None,
+    **kwargs,
+) -> httpx.Response:
+    """
+    Асинхронный запрос с повтором и экспоненциальной задержкой.
+
+    Для методов из RETRY_METHODS повторяются ответы из RETRY_STATUSES и
+    сетевые ошибки, для остальных - только ошибки соединения. После
+    исчерпания попыток возвращается последний ответ или пробрасывается
+    последняя ошибка.
+    """
+    client = client or get_async_client()
+    retryable = method.upper() in RETRY_METHODS
+    for attempt in range(settings.HTTP_RETRIES + 1):
+        last_attempt = attempt == settings.HTTP_RETRIES
+        try:
+            response = await client.request(method, url, **kwargs)
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            if last_attempt:
+                raise
+        except httpx.TransportError:
+            if last_attempt or not retryable:
+                raise
+        else:
+            if (
+                response.status_code not in RETRY_STATUSES
+                or last_attempt
+                or not retryable
+            ):
+                return response
+        await asyncio.sleep(settings.HTTP_BACKOFF_FACTOR * 2**attempt)
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """
+    Общий для процесса event loop в фоновом потоке.
+
+    Синхронный код (задачи Celery, в том числе в пуле потоков) отправляет
+    в него корутины через run_async, поэтому запросы всех задач процесса
+    идут через один асинхронный клиент и его пул соединений.
+    """
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(
+                target=_loop.run_forever, name="ks_async_loop", daemon=True
+            ).start()
+        return _loop
+
+
+def run_async(coroutine: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """Выполняет корутину в фоновом event loop и ждёт результат."""
+    future = asyncio.run_coroutine_threadsafe(coroutine, get_background_loop())
+    return future.result(timeout)
@@ -0,0 +1,72 @@
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Set, Tuple
+
+from analyze import patterns
+
+Span = Tuple[int, int]
+
+# Сколько символов перед словом "дней" может занимать "N ..." (число,
+# пробелы и до 41 символа пояснения, см. patterns.DURATION_GAP)
+DURATION_WINDOW = 64
+
+
+class KeywordIndex:
+    """
+    Позиции ключевых слов валидаторов в тексте документа.
+
+    Строится одним проходом шаблона patterns.KEYWORDS: для каждого вида
+    (price, license, certificate, guarantee, date, number, days) хранятся
+    границы совпадений в порядке появления в тексте.
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.hits: Dict[str, List[Span]] = defaultdict(list)
+        for match in patterns.KEYWORDS.finditer(text):
+            self.hits[match.lastgroup].append(match.span())
+
+    def spans(self, kind: str) -> List[Span]:
+        return self.hits.get(kind, [])
+
+    def starts(self, kind: str) -> List[int]:
+        return [start for start, _ in self.spans(kind)]
+
+    def has(self, kind: str) -> bool:
+        return bool(self.hits.get(kind))
+
+    def words(self, kind: str) -> List[str]:
+        return [self.text[start:end] for start, end in self.spans(kind)]
+
+    def mentioned_days(self) -> Set[int]:
+        """
+        Все N, упомянутые в тексте как срок "N ... дней" (между числом и
+        словом - patterns.DURATION_GAP). Граница слова перед N не
+        требуется, как и в прежнем поиске по шаблону для каждого N, поэтому
+        учитываются все "хвосты" числа: для "130 дней" - 130, 30 и 0.
+        """
+        numbers = self.spans("number")
+        number_ends = [end for _, end in numbers]
+        days = set()
+        for day_start, _ in self.spans("days"):
+            first = bisect_left(number_ends, day_start - DURATION_WINDOW)
+            for index in range(first, len(numbers)):
+                start, end = numbers[index]
+                if end > day_start:
+                    break
+                if patterns.DURATION_GAP.fullmatch(self.text, end, day_start):
+                    digits = self.text[start:end]
+                    days.update(int(digits[i:]) for i in range(len(digits)))
+        return days
+
+
+def extract_dates(text: str) -> List[datetime]:
+    """Корректные даты ДД.ММ.ГГГГ (ДД-ММ-ГГГГ) текста по возрастанию."""
+    dates = []
+    for day, month, year in patterns.DATE.findall(text):
+        try:
+            dates.append(datetime(int(year), int(month), int(day)))
+        except ValueError:
+            pass
+    return sorted(dates)
@@ -0,0 +1,60 @@
+"""
+Скомпилированные регулярные выражения валидаторов.
+
+Постоянные шаблоны компилируются один раз при импорте, шаблоны с
+параметром (сумма обеспечения) - один раз на значение параметра и
+хранятся в lru_cache.
+"""
+
+import re
+from functools import lru_cache
+from typing import Pattern
+
+PRICE_WORDS = re.compile(
+    r"\b(цена(?:ми|х|м|ми|у|ы|е|ой|ю)?|стоимость(?:ю|и|ям|ей|ями)?)\b",
+    re.IGNORECASE,
+)
+DATE = re.compile(r"\b(\d{2})[-.](\d{2})[-.](\d{4})\b")
+GUARANTEE_AMOUNT = re.compile(
+    r"размер обеспечения исполнения Контракта составляет\s+\d+(?:\s\d+)*"
+    r"\sрублей\s\d{2}\sкопеек".lower()
+)
+TZ_TITLE = re.compile("ТЕХНИЧЕСКОЕ ЗАДАНИЕ", re.IGNORECASE)
+GENERAL_INFO = re.compile("Общая информация об объекте закупки", re.IGNORECASE)
+SPECIFICATION_JUNK = re.compile(r'[^a-zA-Zа-яА-Я0-9.,;:"\'\s-]')
+NON_WORD = re.compile(r"[^a-zA-Zа-яА-ЯёЁ0-9\s]")
+WHITESPACE = re.compile(r"\s+")
+# Допустимый текст между числом и словом "дней" в сроке "N ... дней"
+DURATION_GAP = re.compile(r"\s*(?:[^\s\d].{0,40})?\s*")
+DIGITS = re.compile(r"\d+")
+WORD = re.compile(r"\w+")
+# Сумма в рублях: число, за которым следует "руб"/"рубл..."
+RUBLE_AMOUNT = re.compile(r"\d\s*(?:рубл|руб\b)")
+GUARANTEE_PHRASE = (
+    r"размер\s*обеспечения\s*исполнения\s*контракта\s*составляет"
+)
+
+# Все ключевые слова валидаторов одним шаблоном: один проход по тексту
+# даёт вид (имя группы) и позицию каждого совпадения. Даты стоят перед
+# числами, чтобы число не "съело" начало даты.
+KEYWORDS = re.compile(
+    "|".join(
+        [
+            rf"(?P<price>(?i:{PRICE_WORDS.pattern}))",
+            r"(?P<license>лицензи)",
+            r"(?P<certificate>сертификат)",
+            rf"(?P<guarantee>{GUARANTEE_PHRASE})",
+            rf"(?P<date>{DATE.pattern})",
+            r"(?P<number>\d+)",
+            r"(?P<days>дней|дня|день)",
+        ]
+    )
+)
+
+
+@lru_cache(maxsize=256)
+def guarantee_pattern(expected_text: str) -> Pattern:
+    """Фраза о размере обеспечения с суммой прописью `expected_text`."""
+    return re.compile(
+        GUARANTEE_PHRASE + r"\s*" + re.escape(expected_text.lower())
+    )
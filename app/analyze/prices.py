@@ -0,0 +1,158 @@
+"""
+Поиск цены контракта в тексте без LLM.
+
+Тексты документов нормализованы clear_text: разделители тысяч - пробелы,
+а запятая и точка перед копейками удалены ("1 250 000,00" превращается в
+"1 250 00000"). Поэтому каждая группа цифр рассматривается и как сумма в
+рублях, и как сумма с копейками в двух последних цифрах. Суммы прописью
+разбираются в число и сравниваются с ценой так же, как цифры.
+"""
+
+from typing import List, Optional, Set
+
+from analyze import patterns
+
+
+def amount_candidates(text: str, start: int = 0, end: int = -1) -> Set[float]:
+    """
+    Возможные суммы в text[start:end]: числа и числа с разрядами через
+    пробел ("1 250 000"), каждое как рубли и как рубли с копейками.
+    """
+    end = len(text) if end < 0 else end
+    tokens = [
+        (match.start(), match.end(), match.group())
+        for match in patterns.DIGITS.finditer(text, start, end)
+    ]
+    values = set()
+    for index, (_, previous_end, digits) in enumerate(tokens):
+        values.update((int(digits), int(digits) / 100))
+        for token_start, token_end, group in tokens[index + 1 :]:
+            # Следующий разряд: ровно три цифры через пробел, либо три
+            # цифры со слитыми копейками
+            if text[previous_end:token_start] != " " or len(group) not in (
+                3,
+                5,
+            ):
+                break
+            digits += group
+            values.update((int(digits), int(digits) / 100))
+            previous_end = token_end
+            if len(group) == 5:
+                break
+    return values
+
+
+NUMBER_WORDS = {
+    word: value
+    for value, words in {
+        0: "ноль",
+        1: "один одна одно одного одной",
+        2: "два две двух",
+        3: "три трех трёх",
+        4: "четыре четырех четырёх",
+        5: "пять пяти",
+        6: "шесть шести",
+        7: "семь семи",
+        8: "восемь восьми",
+        9: "девять девяти",
+        10: "десять десяти",
+        11: "одиннадцать одиннадцати",
+        12: "двенадцать двенадцати",
+        13: "тринадцать тринадцати",
+        14: "четырнадцать четырнадцати",
+        15: "пятнадцать пятнадцати",
+        16: "шестнадцать шестнадцати",
+        17: "семнадцать семнадцати",
+        18: "восемнадцать восемнадцати",
+        19: "девятнадцать девятнадцати",
+        20: "двадцать двадцати",
+        30: "тридцать тридцати",
+        40: "сорок сорока",
+        50: "пятьдесят пятидесяти",
+        60: "шестьдесят шестидесяти",
+        70: "семьдесят семидесяти",
+        80: "восемьдесят восьмидесяти",
+        90: "девяносто девяноста",
+        100: "сто ста",
+        200: "двести двухсот",
+        300: "триста трехсот трёхсот",
+        400: "четыреста четырехсот четырёхсот",
+        500: "пятьсот пятисот",
+        600: "шестьсот шестисот",
+        700: "семьсот семисот",
+        800: "восемьсот восьмисот",
+        900: "девятьсот девятисот",
+    }.items()
+    for word in words.split()
+}
+MULTIPLIERS = {
+    word: value
+    for value, words in {
+        10**3: "тысяча тысячи тысяч тысячу",
+        10**6: "миллион миллиона миллионов",
+        10**9: "миллиард миллиарда миллиардов",
+    }.items()
+    for word in words.split()
+}
+
+
+def spelled_amounts(text: str, start: int = 0, end: int = -1) -> Set[int]:
+    """
+    Числа прописью, начинающиеся в text[start:end] ("два миллиона
+    пятьсот тысяч" - 2 500 000). Сравниваются целые слова, число читается
+    до первого слова, которое его не продолжает, даже за границей окна.
+    """
+    end = len(text) if end < 0 else end
+    values = set()
+    total = current = 0
+    in_number = False
+    for match in patterns.WORD.finditer(text, start):
+        word = match.group()
+        value = NUMBER_WORDS.get(word)
+        multiplier = MULTIPLIERS.get(word)
+        if value is None and multiplier is None:
+            if in_number:
+                values.add(total + current)
+                total = current = 0
+                in_number = False
+            if match.start() >= end:
+                break
+            continue
+        if match.start() >= end and not in_number:
+            break
+        in_number = True
+        if multiplier is not None:
+            total += (current or 1) * multiplier
+            current = 0
+        else:
+            current += value
+    if in_number:
+        values.add(total + current)
+    return values
+
+
+def matches_amount(candidate: float, target: float, tolerance: float) -> bool:
+    return abs(candidate - target) <= tolerance * target
+
+
+def classify_window(
+    text: str, start: int, end: int, targets: List[float], tolerance: float
+) -> Optional[bool]:
+    """
+    Числовой вердикт по окну text[start:end] вокруг упоминания цены.
+
+    True - в окне есть одна из сумм `targets` (цифрами или прописью),
+    False - в окне есть другие суммы в рублях, None - сумм нет и решение
+    остаётся за LLM.
+    """
+    candidates = amount_candidates(text, start, end)
+    candidates |= spelled_amounts(text, start, end)
+    for target in targets:
+        if any(
+            matches_amount(candidate, target, tolerance)
+            for candidate in candidates
+        ):
+            return True
+    if patterns.RUBLE_AMOUNT.search(text, start, end):
+        return False
+    return None
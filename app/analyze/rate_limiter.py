@@ -0,0 +1,278 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Iterator, Optional
+from urllib.parse import urlparse
+
+import redis
+import requests
+from config import settings
+
+THROTTLE_STATUSES = (429, 500, 502, 503, 504)
+# Ошибки при чтении тела ответа, которые считаются признаком перегрузки
+STREAM_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+# Атомарное списание токена; текущая скорость хранится в том же ключе,
+# чтобы её снижение сразу видели все воркеры.
+TAKE_TOKEN_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'rate')
+local now = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local rate = tonumber(state[3]) or tonumber(ARGV[3])
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens < 1 then
+    wait = (1 - tokens) / rate
+else
+    tokens = tokens - 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now, 'rate', rate)
+redis.call('EXPIRE', KEYS[1], 3600)
+return tostring(wait)
+"""
+
+
+class TokenBucket:
+    """
+    Token bucket с изменяемой скоростью.
+
+    С клиентом Redis состояние общее для всех воркеров, без него -
+    только для текущего процесса. Если Redis недоступен, токены временно
+    списываются из локального состояния.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        rate: float,
+        capacity: float,
+        redis_client: Optional[redis.Redis] = None,
+    ) -> None:
+        self.key = key
+        self.capacity = capacity
+        self._rate = rate
+        self._tokens = capacity
+        self._timestamp = time.monotonic()
+        self._lock = threading.Lock()
+        self._redis = redis_client
+        self._take_script = (
+            redis_client.register_script(TAKE_TOKEN_SCRIPT)
+            if redis_client is not None
+            else None
+        )
+
+    @property
+    def rate(self) -> float:
+        if self._redis is not None:
+            try:
+                rate = self._redis.hget(self.key, "rate")
+            except redis.RedisError as error:
+                print(error)
+                rate = None
+            if rate is not None:
+                return float(rate)
+        return self._rate
+
+    def set_rate(self, rate: float) -> None:
+        self._rate = rate
+        if self._redis is not None:
+            try:
+                self._redis.hset(self.key, "rate", rate)
+            except redis.RedisError as error:
+                print(error)
+
+    def take(self) -> float:
+        """Списывает токен; возвращает время ожидания, если токенов нет."""
+        if self._take_script is not None:
+            try:
+                return float(
+                    self._take_script(
+                        keys=[self.key],
+                        args=[time.time(), self.capacity, self._rate],
+                    )
+                )
+            except redis.RedisError as error:
+                print(error)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity,
+                self._tokens + (now - self._timestamp) * self._rate,
+            )
+            self._timestamp = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self._rate
+            self._tokens -= 1
+            return 0.0
+
+    def acquire(self) -> None:
+        while True:
+            wait = self.take()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """
+    Ограничитель скорости и числа одновременных запросов к одному хосту.
+
+    Работает по схеме AIMD: ответы 429/5xx (в том числе скрытые повторами
+    сессии) вдвое снижают скорость и допустимую параллельность, медленные
+    ответы немного снижают скорость, быстрые успешные - плавно повышают.
+    Скорость общая для воркеров через Redis, параллельность ограничивается
+    в пределах процесса. Слот занят, пока открыт блок request(), вместе с
+    чтением тела, а задержкой считается время до заголовков ответа: долгая
+    загрузка большого файла не снижает скорость.
+    """
+
+    def __init__(
+        self,
+        bucket: TokenBucket,
+        min_rate: float,
+        max_rate: float,
+        max_concurrency: int,
+        target_latency: float,
+    ) -> None:
+        self.bucket = bucket
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.concurrency = float(max_concurrency)
+        self._active = 0
+        self._condition = threading.Condition()
+
+    def _enter(self) -> None:
+        with self._condition:
+            while self._active >= max(1, int(self.concurrency)):
+                self._condition.wait()
+            self._active += 1
+
+    def _exit(self) -> None:
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    @staticmethod
+    def is_throttled(response: Optional[requests.Response]) -> bool:
+        if response is None:
+            return True
+        if response.status_code in THROTTLE_STATUSES:
+            return True
+        retries = getattr(getattr(response, "raw", None), "retries", None)
+        history = getattr(retries, "history", None) or ()
+        return any(item.status in THROTTLE_STATUSES for item in history)
+
+    def record(self, throttled: bool, latency: float) -> None:
+        # Скорость читается и записывается в Redis вне self._condition:
+        # сетевой запрос не задерживает вход и выход других запросов
+        rate = self.bucket.rate
+        if throttled:
+            rate /= 2
+        elif latency > self.target_latency:
+            rate *= 0.9
+        else:
+            rate += self.min_rate
+        with self._condition:
+            if throttled:
+                self.concurrency = max(1.0, self.concurrency / 2)
+            elif latency <= self.target_latency:
+                self.concurrency = min(
+                    float(self.max_concurrency),
+                    self.concurrency + 1 / self.concurrency,
+                )
+            self._condition.notify_all()
+        self.bucket.set_rate(min(self.max_rate, max(self.min_rate, rate)))
+
+    @contextmanager
+    def request(
+        self, send: Callable[[], requests.Response]
+    ) -> Iterator[requests.Response]:
+        """
+        Отправляет запрос в слоте ограничителя и держит слот до выхода из
+        блока. Задержка - время до ответа send() (для stream=True - до
+        заголовков); ошибки чтения тела считаются признаком перегрузки.
+        """
+        self._enter()
+        try:
+            self.bucket.acquire()
+            start = time.monotonic()
+            try:
+                response = send()
+            except requests.RequestException:
+                self.record(True, time.monotonic() - start)
+                raise
+            latency = time.monotonic() - start
+            throttled = self.is_throttled(response)
+            try:
+                yield response
+            except STREAM_ERRORS:
+                throttled = True
+                raise
+            finally:
+                self.record(throttled, latency)
+        finally:
+            self._exit()
+
+    def call(
+        self, request: Callable[[], requests.Response]
+    ) -> requests.Response:
+        with self.request(request) as response:
+            return response
+
+
+@lru_cache(maxsize=None)
+def get_host_limiter(host: Optional[str]) -> Optional[AdaptiveLimiter]:
+    if host not in settings.RATE_LIMITED_HOSTS:
+        return None
+    # По умолчанию - Redis брокера Celery, общий для всех воркеров
+    redis_url = settings.RATE_LIMIT_REDIS_URL or settings.BROKER_URL
+    redis_client = (
+        redis.Redis.from_url(redis_url)
+        if redis_url.startswith(("redis://", "rediss://", "unix://"))
+        else None
+    )
+    return AdaptiveLimiter(
+        TokenBucket(
+            f"ks:rate:{host}",
+            settings.RATE_LIMIT_RATE,
+            settings.RATE_LIMIT_BURST,
+            redis_client,
+        ),
+        min_rate=settings.RATE_LIMIT_MIN_RATE,
+        max_rate=settings.RATE_LIMIT_MAX_RATE,
+        max_concurrency=settings.RATE_LIMIT_MAX_CONCURRENCY,
+        target_latency=settings.RATE_LIMIT_TARGET_LATENCY,
+    )
+
+
+def call_limited(
+    url: str, request: Callable[[], requests.Response]
+) -> requests.Response:
+    """Выполняет запрос через ограничитель хоста, если он настроен."""
+    limiter = get_host_limiter(urlparse(url).hostname)
+    return limiter.call(request) if limiter else request()
+
+
+@contextmanager
+def limited_request(
+    url: str, send: Callable[[], requests.Response]
+) -> Iterator[requests.Response]:
+    """
+    Как call_limited, но слот ограничителя хоста держится до конца блока:
+    для потоковых загрузок, тело которых читается внутри блока.
+    """
+    limiter = get_host_limiter(urlparse(url).hostname)
+    if limiter is None:
+        yield send()
+        return
+    with limiter.request(send) as response:
+        yield response
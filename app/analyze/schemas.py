@@ -1,7 +1,10 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
 from enum import Enum
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set
 
-from pydantic import BaseModel
+from analyze.keyword_index import KeywordIndex, extract_dates
+from pydantic import BaseModel, PrivateAttr, model_validator
 
 
 class FileSchema(BaseModel):
@@ -10,9 +13,124 @@ class FileSchema(BaseModel):
     pandas_tables: Optional[str]
 
 
+class DocumentRole(str, Enum):
+    TECHNICAL_SPECIFICATION = "technical_specification"
+    CONTRACT = "contract"
+    OTHER = "other"
+
+    @staticmethod
+    def detect(file_name: str, text: str = "") -> "DocumentRole":
+        """Роль документа по имени файла, иначе по началу текста."""
+        name = file_name.lower()
+        if (
+            "тз" in name
+            or "т3" in name
+            or ("техническое" in name and "задание" in name)
+        ):
+            return DocumentRole.TECHNICAL_SPECIFICATION
+        if "контракт" in name or "договор" in name:
+            return DocumentRole.CONTRACT
+        head = text[:250].lower()
+        if "техническое задание" in head:
+            return DocumentRole.TECHNICAL_SPECIFICATION
+        if "контракт" in head or "договор" in head:
+            return DocumentRole.CONTRACT
+        return DocumentRole.OTHER
+
+
+class ParsedDocument(BaseModel):
+    """
+    Разобранный файл закупки.
+
+    `text` - нормализованный clear_text текст всего документа,
+    `page_offsets` - начала страниц в `text`, `tables` - строки таблиц
+    из текстов ячеек.
+    """
+
+    file_name: str = ""
+    role: DocumentRole = DocumentRole.OTHER
+    raw_text: str = ""
+    text: str = ""
+    page_offsets: List[int] = [0]
+    tables: List[List[List[str]]] = []
+    _keywords: Optional[KeywordIndex] = PrivateAttr(default=None)
+    _dates: Optional[List[datetime]] = PrivateAttr(default=None)
+    _mentioned_days: Optional[Set[int]] = PrivateAttr(default=None)
+
+    @classmethod
+    def from_text(cls, text: str, file_name: str = "") -> "ParsedDocument":
+        """Документ из одного уже нормализованного текста без разметки."""
+        text = text or ""
+        return cls(
+            file_name=file_name,
+            role=DocumentRole.detect(file_name, text),
+            raw_text=text,
+            text=text,
+        )
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_offsets)
+
+    def page(self, index: int) -> str:
+        start = self.page_offsets[index]
+        stop = (
+            self.page_offsets[index + 1]
+            if index + 1 < len(self.page_offsets)
+            else len(self.text)
+        )
+        return self.text[start:stop].strip()
+
+    @property
+    def pages(self) -> List[str]:
+        return [self.page(index) for index in range(self.page_count)]
+
+    @property
+    def keywords(self) -> KeywordIndex:
+        """Индекс ключевых слов `text`, строится при первом обращении."""
+        if self._keywords is None or self._keywords.text is not self.text:
+            self._keywords = KeywordIndex(self.text)
+        return self._keywords
+
+    @property
+    def dates(self) -> List[datetime]:
+        """
+        Даты документа по возрастанию. Ищутся в `raw_text`: clear_text
+        удаляет точки и дефисы, и в `text` даты не сохраняются.
+        """
+        if self._dates is None:
+            self._dates = extract_dates(self.raw_text)
+        return self._dates
+
+    def has_date_between(self, start: datetime, end: datetime) -> bool:
+        index = bisect_left(self.dates, start)
+        return index < len(self.dates) and self.dates[index] <= end
+
+    @property
+    def mentioned_days(self) -> Set[int]:
+        """Числа N из упоминаний срока "N ... дней" в `text`."""
+        if self._mentioned_days is None:
+            self._mentioned_days = self.keywords.mentioned_days()
+        return self._mentioned_days
+
+    def page_at(self, position: int) -> int:
+        """Номер страницы, на которую приходится позиция в `text`."""
+        return max(0, bisect_right(self.page_offsets, position) - 1)
+
+
+class DocumentRef(BaseModel):
+    """Ссылка на документ в DocumentStore, передаваемая через брокер."""
+
+    file_name: str
+    role: DocumentRole
+    content_hash: str
+    size: int
+
+
 class KSAttributes(BaseModel):
     files: List[dict]
-    files_parsed: List[str]
+    documents: List[ParsedDocument] = []
+    document_refs: List[DocumentRef] = []
     auction_id: int
     name: str
     isContractGuaranteeRequired: float | bool
@@ -21,6 +139,29 @@ class KSAttributes(BaseModel):
     startCost: float
     contractCost: float | None
 
+    @model_validator(mode="before")
+    @classmethod
+    def documents_from_files_parsed(cls, data):
+        """Поддержка данных со списком текстов `files_parsed`."""
+        if isinstance(data, dict) and "files_parsed" in data:
+            data = dict(data)
+            texts = data.pop("files_parsed") or []
+            if "documents" not in data:
+                names = [
+                    file.get("name", "") for file in data.get("files", [])
+                ]
+                names += [""] * (len(texts) - len(names))
+                data["documents"] = [
+                    ParsedDocument.from_text(text, name)
+                    for text, name in zip(texts, names)
+                ]
+        return data
+
+    @property
+    def files_parsed(self) -> List[str]:
+        """Нормализованные тексты документов в порядке `files`."""
+        return [document.text for document in self.documents]
+
 
 class ValidationOption(int, Enum):
     VALIDATE_NAMING = 1
@@ -52,13 +193,24 @@ class AnalyzeUrlResponse(BaseModel):
     status: str
 
 
+class SpecificationMatch(BaseModel):
+    """Лучший фрагмент ТЗ для позиции поставки."""
+
+    name: str
+    score: float
+    matched: bool
+    fragment: str
+
+
 class ValidationOptionResult(BaseModel):
     status: bool
     description: str
+    matches: List[SpecificationMatch] = []
 
 
 class Result(BaseModel):
     url: str
+    name: Optional[str] = None
     analysis: Dict[ValidationOption, ValidationOptionResult]
 
 
@@ -72,3 +224,11 @@ class TwoTextsInput(BaseModel):
 
     first: str
     second: str
+
+
+class SimilarityScores(BaseModel):
+    """Метрики сходства двух текстов из ответа /similarity сервиса модели."""
+
+    cosine: float
+    euclidean: float
+    dot: float
@@ -1,44 +1,94 @@
+import hashlib
 import json
 import os
-from typing import Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Dict, List, Optional
+from urllib.parse import urlparse
 
-import requests
-from analyze.schemas import KSAttributes
-from analyze.utils import read_file
+from analyze.cache import (
+    AuctionMetadataCache,
+    ParsedDocumentCache,
+    get_auction_metadata_cache,
+    get_parsed_document_cache,
+)
+from analyze.http_client import get_session
+from analyze.rate_limiter import call_limited, limited_request
+from analyze.schemas import KSAttributes, ParsedDocument
+from analyze.utils import (
+    STREAM_EXTENSIONS,
+    file_extension,
+    parse_file,
+    parse_stream,
+    scratch_workspace,
+)
+from config import settings
+from pydantic import ValidationError
 
-DIR_NAME = "resources"
-DIR_PATH = "./resources/_"
-FILE_PATH = DIR_PATH + "{auction_id}_{file_name}"
+AUCTION_API_URL = (
+    "https://zakupki.mos.ru/newapi/api/Auction/Get?auctionId={auction_id}"
+)
+DOWNLOAD_URL = (
+    "https://zakupki.mos.ru/newapi/api/FileStorage/Download?id={file_id}"
+)
 
 
 class ParserWeb:
 
-    def __init__(self, url: str) -> None:
+    def __init__(
+        self, url: str, metadata_cache: Optional[AuctionMetadataCache] = None
+    ) -> None:
         self.url: str = url
         self.attributes: Optional[KSAttributes] = None
+        self.metadata_cache = metadata_cache or get_auction_metadata_cache()
+
+    @property
+    def auction_id(self) -> str:
+        return self.url.split("/")[-1]
 
     def is_real_url(self) -> bool:
-        result = requests.get(self.url)
+        result = call_limited(self.url, lambda: get_session().get(self.url))
         return result.status_code == 200
 
-    def get_attributes_ks(self) -> Optional[KSAttributes]:
+    def get_attributes_ks(
+        self, cached: Optional[dict] = None
+    ) -> Optional[KSAttributes]:
+        """
+        Запрос атрибутов закупки в Auction/Get.
+
+        Если передана запись кэша, запрос делается условным и при ответе
+        304 возвращается закэшированный скелет атрибутов.
+        """
         try:
-            auction_id = self.url.split("/")[-1]
-            result = json.loads(
-                requests.get(
-                    f"https://zakupki.mos.ru/newapi/api/Auction/Get?auctionId={auction_id}"
-                ).content.decode()
+            auction_id = self.auction_id
+            headers = {}
+            if cached and cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached and cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+            api_url = AUCTION_API_URL.format(auction_id=auction_id)
+            response = call_limited(
+                api_url, lambda: get_session().get(api_url, headers=headers)
             )
+            if cached and response.status_code == 304:
+                self.metadata_cache.touch(auction_id, cached)
+                return KSAttributes(**cached["attributes"])
+            result = json.loads(response.content.decode())
             result = KSAttributes(
                 auction_id=auction_id,
                 files=[
                     {
+                        "id": file["id"],
                         "name": file["name"],
-                        "downloads_link": f"https://zakupki.mos.ru/newapi/api/FileStorage/Download?id={file['id']}",
+                        "downloads_link": DOWNLOAD_URL.format(
+                            file_id=file["id"]
+                        ),
                     }
                     for file in result["files"]
                 ],
-                files_parsed=[],
+                documents=[],
                 name=result["name"],
                 isContractGuaranteeRequired=(
                     result["contractGuaranteeAmount"]
@@ -54,57 +104,195 @@ class ParserWeb:
                 startCost=result["startCost"],
                 contractCost=result["contractCost"],
             )
+            self.metadata_cache.put(
+                auction_id,
+                result.model_dump(),
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+            )
             return result
         except Exception as error:
             print(error)
             return None
 
     def fetch_and_parse(self) -> Optional[KSAttributes]:
+        cached = self.metadata_cache.get(self.auction_id)
+        if cached is not None:
+            if self.metadata_cache.is_fresh(cached):
+                return KSAttributes(**cached["attributes"])
+            return self.get_attributes_ks(cached)
         return self.get_attributes_ks() if self.is_real_url() else None
 
 
 class FilesProcessor:
+    """
+    Загрузка и разбор вложений закупки.
 
-    def __init__(self):
-        pass
+    Файлы скачиваются и разбираются в пуле потоков: пока один файл
+    разбирается, остальные продолжают скачиваться. Число одновременных
+    загрузок с одного хоста ограничено семафором, общим для всех
+    экземпляров в процессе.
+    """
 
-    @staticmethod
-    def download_file(
-        download_link: str, file_name: str, auction_id: int
+    _host_limits: Dict[str, threading.BoundedSemaphore] = {}
+    _host_limits_lock = threading.Lock()
+    # Значение cache по умолчанию: общий кэш из PARSED_CACHE_PATH;
+    # cache=None отключает кэш
+    DEFAULT_CACHE = object()
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        per_host_limit: Optional[int] = None,
+        cache: Optional[ParsedDocumentCache] = DEFAULT_CACHE,
     ) -> None:
-        response = requests.get(download_link, stream=True)
-        response.raise_for_status()
+        self.max_workers = max_workers or settings.DOWNLOAD_MAX_WORKERS
+        self.per_host_limit = (
+            per_host_limit or settings.DOWNLOAD_PER_HOST_LIMIT
+        )
+        if cache is self.DEFAULT_CACHE:
+            cache = get_parsed_document_cache()
+        self.cache = cache
 
-        os.makedirs(DIR_NAME, exist_ok=True)
+    def host_limit(self, download_link: str) -> threading.BoundedSemaphore:
+        host = urlparse(download_link).netloc
+        with self._host_limits_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(
+                    self.per_host_limit
+                )
+            return self._host_limits[host]
 
-        file_path = FILE_PATH.format(
-            auction_id=auction_id, file_name=file_name
-        )
-        with open(file_path, "wb") as file:
+    @staticmethod
+    def stream_download(download_link: str, target: BinaryIO) -> str:
+        """Скачивает файл в поток и возвращает sha256 его содержимого."""
+        digest = hashlib.sha256()
+        with limited_request(
+            download_link,
+            lambda: get_session().get(download_link, stream=True),
+        ) as response:
+            response.raise_for_status()
             for chunk in response.iter_content(chunk_size=8192):
                 if chunk:
-                    file.write(chunk)
+                    target.write(chunk)
+                    digest.update(chunk)
+        return digest.hexdigest()
 
     @staticmethod
-    def parse_file_data(file_name: str, auction_id: int) -> str:
-        file_path = FILE_PATH.format(
-            auction_id=auction_id, file_name=file_name
-        )
-        file_text = read_file(file_path)
-        return file_text
+    def download_file(download_link: str, file_path: Path) -> str:
+        with open(file_path, "wb") as file:
+            return FilesProcessor.stream_download(download_link, file)
 
-    def process_file(self, download_link, file_name, auction_id) -> str:
-        self.download_file(download_link, file_name, auction_id)
-        return self.parse_file_data(file_name, auction_id)
+    @staticmethod
+    def parse_file_data(file_path: Path, file_name: str) -> ParsedDocument:
+        return parse_file(str(file_path), file_name)
 
-    def generate_parsed_files_data(self, page_data: KSAttributes):
-        if page_data:
-            for file in page_data.files:
-                page_data.files_parsed.append(
-                    self.process_file(
-                        file["downloads_link"],
-                        file["name"],
-                        page_data.auction_id,
+    @staticmethod
+    def load_cached(cached: str, file_name: str) -> ParsedDocument:
+        """Документ из кэша; записи старого формата содержат только текст."""
+        try:
+            document = ParsedDocument.model_validate_json(cached)
+        except ValidationError:
+            return ParsedDocument.from_text(cached, file_name)
+        return document.model_copy(update={"file_name": file_name})
+
+    @staticmethod
+    def scratch_path(workspace: Path, index: int, file_name: str) -> Path:
+        """Путь файла в рабочей директории задачи, уникальный по индексу."""
+        return workspace / f"{index}_{Path(file_name).name}"
+
+    def process_file(
+        self,
+        download_link: str,
+        file_path: Path,
+        file_id=None,
+        file_name: Optional[str] = None,
+    ) -> ParsedDocument:
+        """
+        Скачивание и разбор одного файла.
+
+        PDF, XLSX и DOCX скачиваются в SpooledTemporaryFile и разбираются
+        прямо из него. На диск, в `file_path`, попадают только DOC, которым
+        нужен LibreOffice.
+        """
+        file_name = file_name or file_path.name
+        if self.cache:
+            cached = self.cache.get_by_file_id(file_id)
+            if cached is not None:
+                return self.load_cached(cached, file_name)
+
+        extension = file_extension(file_path.name)
+        buffer = None
+        try:
+            with self.host_limit(download_link):
+                if extension in STREAM_EXTENSIONS:
+                    buffer = SpooledTemporaryFile(
+                        max_size=settings.SPOOL_MAX_BYTES
                     )
+                    digest = self.stream_download(download_link, buffer)
+                else:
+                    digest = self.download_file(download_link, file_path)
+
+            if self.cache:
+                cached = self.cache.get_by_hash(digest)
+                if cached is not None:
+                    self.cache.link(file_id, digest)
+                    return self.load_cached(cached, file_name)
+
+            if buffer is not None:
+                buffer.seek(0)
+                document = parse_stream(buffer, extension, file_name)
+            else:
+                document = self.parse_file_data(file_path, file_name)
+        finally:
+            if buffer is not None:
+                buffer.close()
+            elif file_path.exists():
+                file_path.unlink()
+
+        if self.cache:
+            self.cache.put(digest, document.model_dump_json(), file_id)
+        return document
+
+    def generate_parsed_pages_data(
+        self, pages: List[Optional[KSAttributes]]
+    ) -> List[Optional[KSAttributes]]:
+        """
+        Параллельно скачивает и разбирает файлы сразу нескольких закупок.
+
+        Все файлы задачи складываются в её собственную временную
+        директорию, которая удаляется по завершении. Порядок
+        `documents` каждой закупки совпадает с порядком `files`.
+        """
+        jobs = [(page, file) for page in pages if page for file in page.files]
+        with scratch_workspace() as workspace:
+
+            def process_job(index: int, file: dict) -> ParsedDocument:
+                return self.process_file(
+                    file["downloads_link"],
+                    self.scratch_path(workspace, index, file["name"]),
+                    file.get("id"),
+                    file["name"],
                 )
-            return page_data
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                documents = list(
+                    executor.map(
+                        process_job,
+                        range(len(jobs)),
+                        [file for _, file in jobs],
+                    )
+                )
+        for (page, _), document in zip(jobs, documents):
+            page.documents.append(document)
+        return pages
+
+    def generate_parsed_files_data(self, page_data: KSAttributes):
+        if page_data:
+            return self.generate_parsed_pages_data([page_data])[0]
+
+
+def ingest_url(url: str) -> Optional[KSAttributes]:
+    """Получение атрибутов закупки и разбор всех её файлов."""
+    page_data = ParserWeb(url).fetch_and_parse()
+    return FilesProcessor().generate_parsed_files_data(page_data)
@@ -0,0 +1,90 @@
+"""
+Сопоставление позиций поставок с текстом ТЗ по векторам фрагментов.
+
+ТЗ режется на перекрывающиеся фрагменты, каждый из которых укладывается в
+лимит токенов модели. Векторы фрагментов запрашиваются пакетами, и для
+каждого пакета строится матрица сходства "позиция x фрагмент"; хранится
+только лучший фрагмент каждой позиции, поэтому память не зависит от
+размера документа, а число запросов растёт линейно.
+"""
+
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from analyze import patterns
+from analyze.schemas import SpecificationMatch
+from config import settings
+
+
+def specification_items(deliveries: List[Dict]) -> List[str]:
+    """Уникальные наименования позиций всех поставок в порядке появления."""
+    items = {}
+    for delivery in deliveries:
+        for item in delivery.get("items", []):
+            name = patterns.SPECIFICATION_JUNK.sub("", item["name"])
+            name = patterns.WHITESPACE.sub(" ", name).strip().lower()
+            if name:
+                items.setdefault(name)
+    return list(items)
+
+
+def chunk_text(
+    text: str, words: Optional[int] = None, overlap: Optional[int] = None
+) -> List[str]:
+    """
+    Фрагменты по `words` слов, соседние перекрываются на `overlap`
+    (по умолчанию SPECIFICATION_CHUNK_WORDS и SPECIFICATION_CHUNK_OVERLAP).
+    """
+    words = words or settings.SPECIFICATION_CHUNK_WORDS
+    if overlap is None:
+        overlap = settings.SPECIFICATION_CHUNK_OVERLAP
+    tokens = text.split()
+    step = max(1, words - overlap)
+    return [
+        " ".join(tokens[start : start + words])
+        for start in range(0, max(len(tokens) - overlap, 1), step)
+        if tokens[start : start + words]
+    ]
+
+
+def chunk_batches(chunks: List[str]) -> Iterator[Tuple[int, List[str]]]:
+    """Пакеты по EMBED_BATCH_SIZE фрагментов для запросов /embed."""
+    size = settings.EMBED_BATCH_SIZE
+    for offset in range(0, len(chunks), size):
+        yield offset, chunks[offset : offset + size]
+
+
+class ItemMatcher:
+    """Лучший фрагмент ТЗ для каждой позиции по мере поступления пакетов."""
+
+    def __init__(self, item_vectors: np.ndarray) -> None:
+        self.item_vectors = item_vectors
+        self.best_scores = np.full(len(item_vectors), -1.0)
+        self.best_chunks = np.zeros(len(item_vectors), dtype=int)
+
+    def update(self, chunk_vectors: np.ndarray, offset: int) -> None:
+        # Векторы нормированы: скалярное произведение - косинусное сходство
+        scores = self.item_vectors @ chunk_vectors.T
+        best = scores.argmax(axis=1)
+        best_scores = scores[np.arange(len(best)), best]
+        improved = best_scores > self.best_scores
+        self.best_scores[improved] = best_scores[improved]
+        self.best_chunks[improved] = best[improved] + offset
+
+    def all_matched(self, threshold: float) -> bool:
+        return bool((self.best_scores >= threshold).all())
+
+    def matches(
+        self, items: List[str], chunks: List[str], threshold: float
+    ) -> List[SpecificationMatch]:
+        return [
+            SpecificationMatch(
+                name=item,
+                score=round(float(score), 4),
+                matched=bool(score >= threshold),
+                fragment=chunks[chunk],
+            )
+            for item, score, chunk in zip(
+                items, self.best_scores, self.best_chunks
+            )
+        ]
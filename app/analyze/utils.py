@@ -1,93 +1,474 @@
 import io
+import multiprocessing
 import os
-import re
-import subprocess
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import repeat
 from pathlib import Path
-from typing import Callable, Dict
+from typing import (
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+from xml.etree import ElementTree
 
-import pandas as pd
+import openpyxl
+from analyze import patterns
+from analyze.converter import convert_to_pdf, get_conversion_pool
+from analyze.schemas import DocumentRole, ParsedDocument
+from config import settings
 from PyPDF2 import PdfReader
 
-pd.set_option("display.max_colwidth", None)
+BinaryData = Union[bytes, BinaryIO]
+Table = List[List[str]]
+# Тексты страниц и таблицы документа
+Content = Tuple[List[str], List[Table]]
 
+# Форматы, которые разбираются прямо из потока, без LibreOffice и диска
+STREAM_EXTENSIONS = ("pdf", "xlsx", "xls", "docx")
 
-def extract_text_from_pdf(pdf_bytes: bytes) -> str:
-    pdf_stream = io.BytesIO(pdf_bytes)
-    reader = PdfReader(pdf_stream)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text() + "\n"
-    return text.strip()
+WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+DOCX_HEADER_PREFIX = "word/header"
+DOCX_FOOTER_PREFIX = "word/footer"
+DOCX_BODY = "word/document.xml"
+
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+_extraction_pool_pid: Optional[int] = None
+_extraction_pool_lock = threading.Lock()
+# Последний открытый PDF процесса пула: (путь, mtime, файл, reader)
+_open_pdf_state: Optional[Tuple[str, int, BinaryIO, PdfReader]] = None
+
+
+def content_to_text(content: Content) -> str:
+    pages, _ = content
+    return "\n".join(pages).strip()
+
+
+def _as_stream(data: BinaryData) -> BinaryIO:
+    return io.BytesIO(data) if isinstance(data, bytes) else data
+
+
+def _remaining_size(data: BinaryData) -> int:
+    if isinstance(data, bytes):
+        return len(data)
+    position = data.tell()
+    size = data.seek(0, os.SEEK_END)
+    data.seek(position)
+    return size - position
+
+
+@contextmanager
+def shared_file(data: BinaryData, suffix: str = "") -> Iterator[str]:
+    """
+    Путь к содержимому data, который могут открыть процессы пула.
+
+    Файл на диске передаётся как есть; поток или байты копируются во
+    временный файл кусками, без чтения потока целиком в память.
+    """
+    name = getattr(data, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        yield name
+        return
+    if settings.SCRATCH_DIR:
+        os.makedirs(settings.SCRATCH_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        prefix="ks_extract_", suffix=suffix, dir=settings.SCRATCH_DIR
+    ) as target:
+        if isinstance(data, bytes):
+            target.write(data)
+        else:
+            shutil.copyfileobj(data, target)
+        target.flush()
+        yield target.name
+
+
+def get_extraction_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Общий для процесса пул процессов для извлечения текста.
+
+    Возвращает None, если пул выключен (EXTRACTION_PROCESSES = 0) или
+    текущий процесс демонический (дочерний процесс prefork-пула Celery не
+    может порождать процессы) - тогда текст извлекается в текущем процессе.
+    Поэтому задачи разбора идут в очередь INGEST_QUEUE, воркер которой
+    запускается с пулом потоков (см. docker-compose.yml).
+
+    Процессы запускаются через forkserver: fork многопоточного воркера
+    копирует блокировки, занятые другими потоками (кэш, логирование,
+    urllib3), и дочерний процесс может на них зависнуть.
+    """
+    global _extraction_pool, _extraction_pool_pid
+    if settings.EXTRACTION_PROCESSES == 0:
+        return None
+    if multiprocessing.current_process().daemon:
+        return None
+    with _extraction_pool_lock:
+        if _extraction_pool is None or _extraction_pool_pid != os.getpid():
+            _extraction_pool = ProcessPoolExecutor(
+                max_workers=settings.EXTRACTION_PROCESSES,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+            _extraction_pool_pid = os.getpid()
+        return _extraction_pool
+
+
+def file_extension(file_name: str) -> str:
+    return file_name.split(".")[-1].lower()
+
+
+def extract_content_from_pdf(pdf_data: BinaryData) -> Content:
+    reader = PdfReader(_as_stream(pdf_data))
+    return [page.extract_text() for page in reader.pages], []
+
+
+def extract_text_from_pdf(pdf_data: BinaryData) -> str:
+    return content_to_text(extract_content_from_pdf(pdf_data))
+
+
+def _open_pdf(path: str, modified: int) -> PdfReader:
+    # Открытый файл, а не путь: PdfReader читает объекты страниц по мере
+    # обращения, а не загружает весь документ. Процесс пула, получивший
+    # несколько диапазонов одного файла, разбирает его один раз; файл
+    # предыдущего документа закрывается, когда приходит следующий.
+    global _open_pdf_state
+    if _open_pdf_state is not None:
+        if _open_pdf_state[:2] == (path, modified):
+            return _open_pdf_state[3]
+        _open_pdf_state[2].close()
+        _open_pdf_state = None
+    file = open(path, "rb")
+    try:
+        reader = PdfReader(file)
+    except Exception:
+        file.close()
+        raise
+    _open_pdf_state = (path, modified, file, reader)
+    return reader
+
+
+def extract_pdf_pages(path: str, start: int, stop: int) -> List[str]:
+    """Извлекает текст страниц [start, stop) PDF-файла."""
+    reader = _open_pdf(path, os.stat(path).st_mtime_ns)
+    return [reader.pages[index].extract_text() for index in range(start, stop)]
+
+
+def extract_content_from_pdf_parallel(
+    path: str, pool: ProcessPoolExecutor
+) -> Content:
+    """
+    Извлекает текст PDF-файла в пуле процессов.
+
+    Документ длиннее PDF_PAGES_PER_TASK страниц делится на диапазоны,
+    тексты диапазонов склеиваются в порядке страниц. Процессы получают
+    только путь к файлу.
+    """
+    with open(path, "rb") as file:
+        page_count = len(PdfReader(file).pages)
+    step = settings.PDF_PAGES_PER_TASK
+    starts = range(0, page_count, step)
+    stops = [min(start + step, page_count) for start in starts]
+    chunks = pool.map(extract_pdf_pages, repeat(path), starts, stops)
+    return [page for chunk in chunks for page in chunk], []
+
+
+def iter_xlsx_rows(
+    xlsx_data: BinaryData,
+    max_rows: Optional[int] = None,
+    max_cells: Optional[int] = None,
+) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Потоково читает XLSX и отдаёт пары (лист, значения непустых ячеек).
+
+    Книга открывается в режиме read_only, строки не накапливаются в
+    памяти. Чтение листа прекращается после `max_rows` строк, чтение
+    книги - после `max_cells` непустых ячеек.
+    """
+    max_rows = max_rows or settings.XLSX_MAX_ROWS
+    max_cells = max_cells or settings.XLSX_MAX_CELLS
+    workbook = openpyxl.load_workbook(
+        _as_stream(xlsx_data), read_only=True, data_only=True
+    )
+    try:
+        cells = 0
+        for sheet in workbook.worksheets:
+            for index, row in enumerate(sheet.iter_rows(values_only=True)):
+                if index >= max_rows:
+                    break
+                values = [
+                    str(value)
+                    for value in row
+                    if value is not None and str(value).strip()
+                ]
+                if not values:
+                    continue
+                cells += len(values)
+                if cells > max_cells:
+                    return
+                yield sheet.title, values
+    finally:
+        workbook.close()
+
+
+def extract_content_from_xlsx(xlsx_data: BinaryData) -> Content:
+    """Текст XLSX (Excel) построчно и строки каждого листа как таблица."""
+    lines: List[str] = []
+    tables: List[Table] = []
+    sheet_name = None
+    for sheet, values in iter_xlsx_rows(xlsx_data):
+        if sheet != sheet_name:
+            sheet_name = sheet
+            lines.append(f"--- Лист: {sheet} ---")
+            tables.append([])
+        lines.append(" ".join(values))
+        tables[-1].append(values)
+    return ["\n".join(lines)], tables
+
+
+def extract_text_from_xlsx(xlsx_data: BinaryData) -> str:
+    """Извлекает текст из XLSX (Excel) построчно, с ограничением объёма."""
+    return content_to_text(extract_content_from_xlsx(xlsx_data))
 
 
-def extract_text_from_xlsx(xlsx_bytes: bytes) -> str:
-    """Извлекает текст из XLSX (Excel)."""
-    xlsx_stream = io.BytesIO(xlsx_bytes)
-    # Читаем все листы и объединяем текст
+def extract_content_from_xls(xls_data: BinaryData) -> Content:
+    """Извлекает текст из старого XLS через pandas (xlrd)."""
+    import pandas as pd
+
+    pd.set_option("display.max_colwidth", None)
     text = []
-    df_dict = pd.read_excel(xlsx_stream, sheet_name=None)  # Все листы
+    df_dict = pd.read_excel(_as_stream(xls_data), sheet_name=None)
     for sheet_name, df in df_dict.items():
         text.append(f"--- Лист: {sheet_name} ---")
         text.append(df.to_string(index=False))
-    return "\n".join(text).strip()
+    return ["\n".join(text)], []
+
+
+def iter_docx_blocks(part: BinaryIO) -> Iterator[Union[str, Table]]:
+    """
+    Потоково читает XML части DOCX.
+
+    Отдаёт абзацы вне таблиц строками, а таблицы верхнего уровня - целиком,
+    списком строк из текстов ячеек. Вложенные таблицы попадают в текст
+    ячейки внешней таблицы.
+    """
+    paragraph: List[str] = []
+    tables: List[dict] = []
+    for event, element in ElementTree.iterparse(part, events=("start", "end")):
+        tag = element.tag
+        if event == "start":
+            if tag == f"{WORD_NS}tbl":
+                tables.append({"rows": [], "cells": [], "cell": []})
+            continue
+        if tag == f"{WORD_NS}t":
+            paragraph.append(element.text or "")
+        elif tag == f"{WORD_NS}tab":
+            paragraph.append("\t")
+        elif tag in (f"{WORD_NS}br", f"{WORD_NS}cr"):
+            paragraph.append("\n")
+        elif tag == f"{WORD_NS}p":
+            text = "".join(paragraph)
+            paragraph = []
+            if tables:
+                tables[-1]["cell"].append(text)
+            elif text.strip():
+                yield text
+        elif tag == f"{WORD_NS}tc":
+            table = tables[-1]
+            table["cells"].append(
+                " ".join(text for text in table["cell"] if text.strip())
+            )
+            table["cell"] = []
+        elif tag == f"{WORD_NS}tr":
+            row = tables[-1]["cells"]
+            tables[-1]["cells"] = []
+            if len(tables) > 1:
+                tables[-2]["cell"].append(" | ".join(row))
+            elif any(cell.strip() for cell in row):
+                tables[-1]["rows"].append(row)
+        elif tag == f"{WORD_NS}tbl":
+            table = tables.pop()
+            if not tables and table["rows"]:
+                yield table["rows"]
+        else:
+            continue
+        element.clear()
+
+
+def extract_content_from_docx(docx_data: BinaryData) -> Content:
+    """
+    Извлекает текст из DOCX без конвертации в PDF: колонтитулы, основной
+    текст и таблицы читаются прямо из zip-архива. Строки таблиц попадают
+    в текст ячейками через " | " и сохраняются отдельно.
+    """
+    lines: List[str] = []
+    tables: List[Table] = []
+    with zipfile.ZipFile(_as_stream(docx_data)) as archive:
+        names = archive.namelist()
+        headers = sorted(n for n in names if n.startswith(DOCX_HEADER_PREFIX))
+        footers = sorted(n for n in names if n.startswith(DOCX_FOOTER_PREFIX))
+        for name in [*headers, DOCX_BODY, *footers]:
+            if name not in names:
+                continue
+            with archive.open(name) as part:
+                for block in iter_docx_blocks(part):
+                    if isinstance(block, str):
+                        lines.append(block)
+                        continue
+                    tables.append(block)
+                    lines.extend(" | ".join(row) for row in block)
+    return ["\n".join(lines)], tables
+
 
+def extract_text_from_docx(docx_data: BinaryData) -> str:
+    return content_to_text(extract_content_from_docx(docx_data))
 
-def extract_text_from_file(file_bytes: bytes, file_extension: str) -> str:
-    """Основная функция для извлечения текста из файла."""
-    handlers: Dict[str, Callable[[bytes], str]] = {
-        "pdf": extract_text_from_pdf,
-        "xlsx": extract_text_from_xlsx,
-        "xls": extract_text_from_xlsx,
-    }
 
+EXTRACTORS: Dict[str, Callable[[BinaryData], Content]] = {
+    "pdf": extract_content_from_pdf,
+    "xlsx": extract_content_from_xlsx,
+    "xls": extract_content_from_xls,
+    "docx": extract_content_from_docx,
+}
+
+
+def extract_content_from_file(
+    file_data: BinaryData, file_extension: str
+) -> Content:
+    """
+    Основная функция для извлечения содержимого файла.
+
+    Возвращает тексты страниц и таблицы (строки из текстов ячеек).
+    Принимает байты или открытый бинарный поток (например,
+    SpooledTemporaryFile), поток читается без лишнего копирования.
+    Файлы от EXTRACTION_MIN_BYTES разбираются в пуле процессов, если он
+    доступен: так документы, которые FilesProcessor обрабатывает в потоках,
+    разбираются на разных ядрах, а большие PDF дополнительно делятся на
+    диапазоны страниц. Процессы пула открывают общий файл на диске.
+    """
     file_extension = file_extension.lower()
 
-    if file_extension in handlers:
-        return handlers[file_extension](file_bytes)
-    else:
+    if file_extension not in EXTRACTORS:
         raise ValueError(f"Unsupported file type: {file_extension}")
 
+    pool = get_extraction_pool()
+    if (
+        pool is None
+        or _remaining_size(file_data) < settings.EXTRACTION_MIN_BYTES
+    ):
+        return EXTRACTORS[file_extension](file_data)
+    with shared_file(file_data, f".{file_extension}") as path:
+        if file_extension == "pdf":
+            return extract_content_from_pdf_parallel(path, pool)
+        return pool.submit(
+            extract_content_from_path, path, file_extension
+        ).result()
+
+
+def extract_content_from_path(path: str, file_extension: str) -> Content:
+    """Извлекает содержимое файла на диске (задача пула процессов)."""
+    with open(path, "rb") as file:
+        return EXTRACTORS[file_extension](file)
+
+
+def extract_text_from_file(file_data: BinaryData, file_extension: str) -> str:
+    """Извлекает текст файла, страницы разделяются переводом строки."""
+    return content_to_text(
+        extract_content_from_file(file_data, file_extension)
+    )
+
 
-def convert_to_pdf(input_path: str) -> tuple:
+@contextmanager
+def scratch_workspace(prefix: str = "ks_ingest_") -> Iterator[Path]:
     """
-    Converts DOC/DOCX to PDF using LibreOffice.
-    Returns path to the generated PDF.
+    Unique temporary directory for one ingestion job.
+    Removed with everything inside when the block exits.
     """
-    input_path = Path(input_path)
-    if not input_path.exists():
-        raise FileNotFoundError(f"Input file not found: {input_path}")
-
-    output_dir = input_path.parent
-
-    subprocess.run(
-        [
-            "soffice",
-            "--headless",
-            "--convert-to",
-            "pdf",
-            str(input_path),
-            "--outdir",
-            str(output_dir),
-        ]
-    )
+    if settings.SCRATCH_DIR:
+        os.makedirs(settings.SCRATCH_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory(
+        prefix=prefix, dir=settings.SCRATCH_DIR
+    ) as path:
+        yield Path(path)
+
 
-    pdf_path = output_dir / f"{input_path.stem}.pdf"
-    return (str(pdf_path) if pdf_path.exists() else None), pdf_path
+def convert_document(input_path: str) -> Path:
+    """
+    Converts DOC to PDF with the persistent LibreOffice pool.
+    Falls back to spawning soffice per file when the pool is unavailable.
+    Returns path to the generated PDF.
+    """
+    pool = get_conversion_pool()
+    if pool is not None:
+        return pool.convert(input_path)
+    return convert_to_pdf(input_path)[1]
 
 
 def clear_text(text: str) -> str:
-    cleaned_string = re.sub(r"[^a-zA-Zа-яА-ЯёЁ0-9\s]", "", text)
-    cleaned_string = re.sub(r"\s+", " ", cleaned_string).strip()
+    cleaned_string = patterns.NON_WORD.sub("", text)
+    cleaned_string = patterns.WHITESPACE.sub(" ", cleaned_string).strip()
     return cleaned_string.lower().replace("nan", "").replace("unnamed", "")
 
 
-def read_file(file_path: str) -> str:
-    if file_path.endswith(".doc") or file_path.endswith(".docx"):
-        convert_to_pdf(file_path)
+def build_document(file_name: str, content: Content) -> ParsedDocument:
+    """
+    Собирает ParsedDocument: нормализует текст постранично, запоминает
+    начало каждой страницы в нормализованном тексте и определяет роль.
+    """
+    pages, tables = content
+    text = ""
+    page_offsets = []
+    for page in pages:
+        page_text = clear_text(page)
+        if text and page_text:
+            text += " "
+        page_offsets.append(len(text))
+        text += page_text
+    return ParsedDocument(
+        file_name=file_name,
+        role=DocumentRole.detect(file_name, text),
+        raw_text=content_to_text(content),
+        text=text,
+        page_offsets=page_offsets,
+        tables=tables,
+    )
+
+
+def parse_stream(
+    stream: BinaryIO, file_extension: str, file_name: str
+) -> ParsedDocument:
+    """Разбирает поток файла формата STREAM_EXTENSIONS."""
+    return build_document(
+        file_name, extract_content_from_file(stream, file_extension)
+    )
+
+
+def parse_file(
+    file_path: str, file_name: Optional[str] = None
+) -> ParsedDocument:
+    """Разбирает файл на диске и удаляет его; DOC сначала конвертируется."""
+    file_name = file_name or Path(file_path).name
+    if file_path.endswith(".doc"):
+        pdf_path = convert_document(file_path)
+        os.remove(file_path)
+        file_path = str(pdf_path)
+    try:
+        with open(file_path, "rb") as file:
+            return parse_stream(file, file_extension(file_path), file_name)
+    finally:
         os.remove(file_path)
-        file_path = file_path.replace(".docx", ".pdf").replace(".doc", ".pdf")
-    file_bytes = Path(file_path).read_bytes()
-    os.remove(file_path)
-    ext = file_path.split(".")[-1]
-    text = extract_text_from_file(file_bytes, ext)
-    return clear_text(text)
+
+
+def read_stream(stream: BinaryIO, file_extension: str) -> str:
+    """Извлекает и очищает текст из потока файла формата STREAM_EXTENSIONS."""
+    return clear_text(extract_text_from_file(stream, file_extension))
+
+
+def read_file(file_path: str) -> str:
+    return parse_file(file_path).text
@@ -1,40 +1,116 @@
-import re
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import as_completed
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
+import httpx
+import numpy as np
 import requests
+from analyze import patterns
+from analyze.fuzzy import best_match
+from analyze.http_client import arequest, get_session
+from analyze.prices import classify_window
 from analyze.schemas import (
+    DocumentRole,
     FileSchema,
     KSAttributes,
+    ParsedDocument,
+    SimilarityScores,
+    SpecificationMatch,
     TwoTextsInput,
     ValidationOption,
     ValidationOptionResult,
 )
-from fuzzywuzzy import fuzz
+from analyze.specifications import (
+    ItemMatcher,
+    chunk_batches,
+    chunk_text,
+    specification_items,
+)
+from config import settings
 from num2words import num2words
 
+_pools: Dict[str, Tuple[int, ThreadPoolExecutor]] = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(name: str, workers: int) -> Optional[ThreadPoolExecutor]:
+    """Пул потоков `name` текущего процесса; None, если workers <= 1."""
+    if workers <= 1:
+        return None
+    with _pools_lock:
+        pid, pool = _pools.get(name, (None, None))
+        if pool is None or pid != os.getpid():
+            pool = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix=f"ks_{name}"
+            )
+            _pools[name] = (os.getpid(), pool)
+        return pool
+
+
+def get_validation_pool() -> Optional[ThreadPoolExecutor]:
+    """
+    Общий для процесса пул потоков для проверок.
+
+    None, если параллельный режим выключен (VALIDATION_WORKERS <= 1).
+    """
+    return _get_pool("validation", settings.VALIDATION_WORKERS)
+
+
+def get_llm_pool() -> Optional[ThreadPoolExecutor]:
+    """
+    Пул потоков для одновременных запросов к LLM внутри одной проверки.
+
+    Отдельный от get_validation_pool: проверка, занявшая поток пула
+    проверок, не ждёт освобождения потоков того же пула.
+    """
+    return _get_pool("llm", settings.LLM_CONCURRENCY)
+
+
+def validation_timeout(option: ValidationOption) -> float:
+    return settings.VALIDATION_TIMEOUTS.get(
+        option.name, settings.VALIDATION_TIMEOUT
+    )
+
 
 class ModelRequest:
     def __init__(self, model_url: str) -> None:
         self.model_url = model_url
 
     def ping(self) -> Dict:
-        return requests.get(self.model_url).json()
+        return get_session().get(self.model_url).json()
 
     def post_request(
         self, url_path: str, data: TwoTextsInput
     ) -> Optional[str]:
         try:
-            return requests.post(
-                f"{self.model_url}/{url_path}", json=data
-            ).json()["result"]
-        except (KeyError, TimeoutError) as error:
+            return (
+                get_session()
+                .post(f"{self.model_url}/{url_path}", json=data)
+                .json()["result"]
+            )
+        except (KeyError, requests.RequestException) as error:
             print(error)
             return None
 
     def llama_prompt(self, data: TwoTextsInput) -> bool:
         result = self.post_request("llama_prompt", data.model_dump())
-        return result.lower() == "yes"
+        return result is not None and result.lower() == "yes"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        result = self.post_request("embed", {"texts": texts})
+        if result is None:
+            raise RuntimeError("Сервис модели не вернул векторы")
+        return np.asarray(result, dtype=np.float32)
+
+    def similarity(self, data: TwoTextsInput) -> Optional[SimilarityScores]:
+        result = self.post_request("similarity", data.model_dump())
+        return SimilarityScores(**result) if result is not None else None
 
     def check_similarity_transformer(self, data: TwoTextsInput) -> float:
         result = self.post_request(
@@ -49,9 +125,63 @@ class ModelRequest:
         return float(result) if result is not None else None
 
 
+class AsyncModelRequest:
+    """
+    Асинхронный аналог ModelRequest на общем httpx-клиенте event loop:
+    одна корутина не держит поток, пока ждёт модель или LLM.
+    """
+
+    def __init__(self, model_url: str) -> None:
+        self.model_url = model_url
+
+    async def ping(self) -> Dict:
+        return (await arequest("GET", self.model_url)).json()
+
+    async def post_request(self, url_path: str, data: Dict) -> Optional[str]:
+        try:
+            response = await arequest(
+                "POST", f"{self.model_url}/{url_path}", json=data
+            )
+            return response.json()["result"]
+        except (KeyError, ValueError, httpx.HTTPError) as error:
+            print(error)
+            return None
+
+    async def llama_prompt(self, data: TwoTextsInput) -> bool:
+        result = await self.post_request("llama_prompt", data.model_dump())
+        return result is not None and result.lower() == "yes"
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        result = await self.post_request("embed", {"texts": texts})
+        if result is None:
+            raise RuntimeError("Сервис модели не вернул векторы")
+        return np.asarray(result, dtype=np.float32)
+
+    async def similarity(
+        self, data: TwoTextsInput
+    ) -> Optional[SimilarityScores]:
+        result = await self.post_request("similarity", data.model_dump())
+        return SimilarityScores(**result) if result is not None else None
+
+    async def check_similarity_transformer(self, data: TwoTextsInput) -> float:
+        result = await self.post_request(
+            "check_similarity_transformer", data.model_dump()
+        )
+        return float(result) if result is not None else None
+
+    async def check_similarity2_transformer(
+        self, data: TwoTextsInput
+    ) -> float:
+        result = await self.post_request(
+            "check_similarity2_transformer", data.model_dump()
+        )
+        return float(result) if result is not None else None
+
+
 class KSValidator:
     def __init__(self, model_url: Optional[str] = None) -> None:
         self.model_requests = ModelRequest(model_url)
+        self.async_model_requests = AsyncModelRequest(model_url)
         self.reference_col_name = {
             "name": ["Наименование", "Название"],
             "quantity": ["Кол.", "Кол-", "Кол-во", "Количество"],
@@ -66,52 +196,251 @@ class KSValidator:
             ValidationOption.VALIDATE_PRICE: self.validate_price,
             ValidationOption.VALIDATE_SPECIFICATIONS: self.validate_specifications,
         }
+        # Проверки, обращающиеся к модели, имеют асинхронные версии;
+        # остальные выполняются в avalidate_content как есть
+        self.async_validation_checks = {
+            ValidationOption.VALIDATE_NAMING: self.avalidate_naming,
+            ValidationOption.VALIDATE_PRICE: self.avalidate_price,
+            ValidationOption.VALIDATE_SPECIFICATIONS: self.avalidate_specifications,
+        }
 
     def validate_content(
         self, page_data, validate_params: List[ValidationOption]
-    ):
-        return {
-            option: self.validation_checks[option](page_data)
+    ) -> Dict[ValidationOption, ValidationOptionResult]:
+        """
+        Выполняет запрошенные проверки.
+
+        При доступном пуле (VALIDATION_WORKERS > 1) проверки идут
+        параллельно, и задача ждёт самую долгую, а не их сумму. Проверка,
+        не уложившаяся в свой таймаут или упавшая с ошибкой, получает
+        отрицательный результат, остальные результаты сохраняются. Без
+        пула проверки идут по очереди, ошибки обрабатываются так же.
+        """
+        options = [
+            option
             for option in validate_params
             if option in self.validation_checks
+        ]
+        pool = get_validation_pool()
+        if pool is None or len(options) < 2:
+            return {
+                option: self.run_check(option, page_data) for option in options
+            }
+
+        started = time.monotonic()
+        futures = {
+            option: pool.submit(self.validation_checks[option], page_data)
+            for option in options
+        }
+        return {
+            option: self.collect_result(
+                future,
+                started + validation_timeout(option) - time.monotonic(),
+            )
+            for option, future in futures.items()
         }
 
-    def validate_price(
-        self, page_data: KSAttributes
+    def run_check(
+        self, option: ValidationOption, page_data
     ) -> ValidationOptionResult:
-        for file_text in page_data.files_parsed:
-            if not file_text:
+        try:
+            return self.validation_checks[option](page_data)
+        except Exception as error:
+            print(error)
+            return self.check_error()
+
+    @staticmethod
+    def check_error() -> ValidationOptionResult:
+        return ValidationOptionResult(
+            status=False, description="Ошибка проверки"
+        )
+
+    @staticmethod
+    def collect_result(
+        future: Future, timeout: float
+    ) -> ValidationOptionResult:
+        try:
+            return future.result(timeout=max(0, timeout))
+        except FutureTimeoutError:
+            # Запущенный поток прервать нельзя: он завершится сам,
+            # а результат будет отброшен
+            future.cancel()
+            return ValidationOptionResult(
+                status=False, description="Превышено время проверки"
+            )
+        except Exception as error:
+            print(error)
+            return KSValidator.check_error()
+
+    async def avalidate_content(
+        self, page_data, validate_params: List[ValidationOption]
+    ) -> Dict[ValidationOption, ValidationOptionResult]:
+        """
+        Асинхронный validate_content: проверки выполняются конкурентно в
+        текущем event loop, у каждой свой таймаут.
+        """
+        options = [
+            option
+            for option in validate_params
+            if option in self.validation_checks
+        ]
+        results = await asyncio.gather(
+            *(self.arun_check(option, page_data) for option in options)
+        )
+        return dict(zip(options, results))
+
+    async def arun_check(
+        self, option: ValidationOption, page_data
+    ) -> ValidationOptionResult:
+        if option in self.async_validation_checks:
+            check = self.async_validation_checks[option](page_data)
+        else:
+            check = asyncio.to_thread(
+                self.validation_checks[option], page_data
+            )
+        try:
+            return await asyncio.wait_for(check, validation_timeout(option))
+        except asyncio.TimeoutError:
+            return ValidationOptionResult(
+                status=False, description="Превышено время проверки"
+            )
+        except Exception as error:
+            print(error)
+            return self.check_error()
+
+    @staticmethod
+    def price_windows(document: ParsedDocument) -> List[Tuple[int, int]]:
+        """
+        Окрестности +-50 символов упоминаний цены в документе;
+        пересекающиеся окрестности соседних упоминаний объединяются, пока
+        окно не длиннее PRICE_WINDOW_MAX_CHARS: каждое окно - отдельный
+        запрос к LLM и должно укладываться в её контекст.
+        """
+        file_text = document.text
+        max_chars = settings.PRICE_WINDOW_MAX_CHARS
+        windows = []
+        for position, match_end in document.keywords.spans("price"):
+            start = max(0, position - 50)
+            end = min(len(file_text) - 1, match_end + 50)
+            if (
+                windows
+                and start <= windows[-1][1]
+                and end - windows[-1][0] <= max_chars
+            ):
+                windows[-1] = (windows[-1][0], max(end, windows[-1][1]))
+            else:
+                windows.append((start, end))
+        return windows
+
+    @staticmethod
+    def price_prompt(
+        page_data: KSAttributes, context_text: str
+    ) -> TwoTextsInput:
+        return TwoTextsInput(
+            first=f"""
+                Initial Contract Price: {page_data.startCost}
+                Maximum Contract Price: {page_data.contractCost}
+                """,
+            second=context_text,
+        )
+
+    def price_prompts(
+        self, page_data: KSAttributes
+    ) -> Tuple[bool, List[TwoTextsInput]]:
+        """
+        Числовая проверка окрестностей упоминаний цены.
+
+        Возвращает (найдено, запросы к LLM): если ни в одном окне сумма
+        не совпала с ценой, запросы строятся только для окон без сумм в
+        рублях - окна с другими суммами LLM не передаются. Одинаковые
+        окна разных файлов дают один запрос.
+        """
+        targets = [
+            cost
+            for cost in (page_data.startCost, page_data.contractCost)
+            if cost
+        ]
+        contexts = {}
+        for document in page_data.documents:
+            if not document.text:
                 continue
-            pattern = r"\b(цена(?:ми|х|м|ми|у|ы|е|ой|ю)?|стоимость(?:ю|и|ям|ей|ями)?)\b"
-            matches = [
-                (match.start(), match.group())
-                for match in re.finditer(
-                    pattern, file_text, flags=re.IGNORECASE
-                )
-            ]
-            prompts = []
-            for position, match in matches:
-                start = max(0, position - 50)
-                end = min(len(file_text) - 1, position + len(match) + 50)
-                context_text = file_text[start:end]
-                prompt = TwoTextsInput(
-                    first=f"""
-                        Initial Contract Price: {page_data.startCost}
-                        Maximum Contract Price: {page_data.contractCost}
-                        """,
-                    second=context_text,
+            for start, end in self.price_windows(document):
+                verdict = classify_window(
+                    document.text,
+                    start,
+                    end,
+                    targets,
+                    settings.PRICE_TOLERANCE,
                 )
-                prompts.append(prompt)
-            for prompt in prompts:
-                result = self.model_requests.llama_prompt(prompt)
-                if result:
-                    return ValidationOptionResult(
-                        status=True, description="Упоминание найдено"
-                    )
-                else:
-                    continue
+                if verdict:
+                    return True, []
+                if verdict is None:
+                    contexts.setdefault(document.text[start:end])
+        return False, [
+            self.price_prompt(page_data, context) for context in contexts
+        ]
+
+    def validate_price(
+        self, page_data: KSAttributes
+    ) -> ValidationOptionResult:
+        found, prompts = self.price_prompts(page_data)
+        if found:
+            return ValidationOptionResult(
+                status=True, description="Упоминание найдено (numeric)"
+            )
+        pool = get_llm_pool()
+        if pool is None or len(prompts) < 2:
+            answers = map(self.model_requests.llama_prompt, prompts)
+            return self.price_llm_result(prompts, any(answers))
+        futures = [
+            pool.submit(self.model_requests.llama_prompt, prompt)
+            for prompt in prompts
+        ]
+        try:
+            found = any(future.result() for future in as_completed(futures))
+        finally:
+            # Ещё не начатые запросы после первого "yes" не отправляются
+            for future in futures:
+                future.cancel()
+        return self.price_llm_result(prompts, found)
+
+    async def avalidate_price(
+        self, page_data: KSAttributes
+    ) -> ValidationOptionResult:
+        found, prompts = self.price_prompts(page_data)
+        if found:
+            return ValidationOptionResult(
+                status=True, description="Упоминание найдено (numeric)"
+            )
+        semaphore = asyncio.Semaphore(max(1, settings.LLM_CONCURRENCY))
+
+        async def ask(prompt: TwoTextsInput) -> bool:
+            async with semaphore:
+                return await self.async_model_requests.llama_prompt(prompt)
+
+        tasks = [asyncio.ensure_future(ask(prompt)) for prompt in prompts]
+        found = False
+        try:
+            for answer in asyncio.as_completed(tasks):
+                if await answer:
+                    found = True
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+        return self.price_llm_result(prompts, found)
+
+    @staticmethod
+    def price_llm_result(
+        prompts: List[TwoTextsInput], found: bool
+    ) -> ValidationOptionResult:
+        if found:
+            return ValidationOptionResult(
+                status=True, description="Упоминание найдено (LLM)"
+            )
+        source = "LLM" if prompts else "numeric"
         return ValidationOptionResult(
-            status=False, description="Упоминание не найдено"
+            status=False, description=f"Упоминание не найдено ({source})"
         )
 
     @staticmethod
@@ -151,39 +480,17 @@ class KSValidator:
                     status=False, description="Упоминание не найдено"
                 )
 
-            matched_dates = []
-            for file_text in page_data.files_parsed:
+            durations = {
+                *range(max(1, duration - 1), duration + 2),
+                duration // 28,
+            }
+            for document in page_data.documents:
                 if date_start is not None and date_end is not None:
-                    pattern = r"\b(\d{2})[-.](\d{2})[-.](\d{4})\b"
-                    file_text = file_text
-                    if not file_text:
+                    if not document.text:
                         continue
-                    matches = re.findall(pattern, file_text)
-                    matched_date = []
-                    for match in matches:
-                        day, month, year = match
-                        try:
-                            matched_date = datetime.strptime(
-                                f"{day}.{month}.{year}", "%d.%m.%Y"
-                            )
-                            matched_dates.append(matched_date)
-                        except ValueError:
-                            pass
-                    for matched_date in matched_dates:
-                        if date_start <= matched_date <= date_end:
-                            date_found = True
-                            break
-                for dur in range(max(1, duration - 1), duration + 2):
-                    duration_pattern = (
-                        rf"{dur}\s*(?:[^\s\d].{{0,40}})?\s*(дней|дня|день)"
-                    )
-                    duration_matches = re.findall(duration_pattern, file_text)
-                    if duration_matches:
+                    if document.has_date_between(date_start, date_end):
                         date_found = True
-                        break
-                duration_pattern = rf"{duration // 28}\s*(?:[^\s\d].{{0,40}})?\s*(дней|дня|день)"
-                duration_matches = re.findall(duration_pattern, file_text)
-                if duration_matches:
+                if not durations.isdisjoint(document.mentioned_days):
                     date_found = True
 
                 result.append(date_found)
@@ -210,12 +517,11 @@ class KSValidator:
         self, page_data: KSAttributes
     ) -> ValidationOptionResult:
         if isinstance(page_data.isContractGuaranteeRequired, bool):
-            for file_text in page_data.files_parsed:
-                if file_text is None:
-                    continue
-
-                pattern = r"размер обеспечения исполнения Контракта составляет\s+\d+(?:\s\d+)*\sрублей\s\d{2}\sкопеек".lower()
-                if re.search(pattern, file_text):
+            for document in page_data.documents:
+                if any(
+                    patterns.GUARANTEE_AMOUNT.match(document.text, start)
+                    for start in document.keywords.starts("guarantee")
+                ):
                     return ValidationOptionResult(
                         status=False, description="Упоминание не найдено"
                     )
@@ -224,17 +530,14 @@ class KSValidator:
             )
 
         else:
-            for file_text in page_data.files_parsed:
-                if file_text is None:
-                    continue
-                expected_text = self.number_to_words(
-                    page_data.isContractGuaranteeRequired
-                )
-                pattern = (
-                    r"размер\s*обеспечения\s*исполнения\s*контракта\s*составляет\s*"
-                    + re.escape(expected_text.lower())
-                )
-                if re.search(pattern, file_text):
+            pattern = patterns.guarantee_pattern(
+                self.number_to_words(page_data.isContractGuaranteeRequired)
+            )
+            for document in page_data.documents:
+                if any(
+                    pattern.match(document.text, start)
+                    for start in document.keywords.starts("guarantee")
+                ):
                     return ValidationOptionResult(
                         status=True, description="Упоминание найдено"
                     )
@@ -242,57 +545,93 @@ class KSValidator:
                     status=False, description="Упоминание не найдено"
                 )
 
-    def validate_naming(
-        self, page_data: KSAttributes
-    ) -> ValidationOptionResult:
-        for file_text in page_data.files_parsed:
-            if not file_text:
-                continue
+    @staticmethod
+    def naming_documents(page_data: KSAttributes) -> List[ParsedDocument]:
+        """Документы закупки: сначала ТЗ, затем проект контракта, затем прочие."""
+        order = {
+            DocumentRole.TECHNICAL_SPECIFICATION: 0,
+            DocumentRole.CONTRACT: 1,
+        }
+        return sorted(
+            page_data.documents,
+            key=lambda document: order.get(document.role, 2),
+        )
 
-            target_phrase_start = "ТЕХНИЧЕСКОЕ ЗАДАНИЕ"
-            match_start = re.search(
-                target_phrase_start, file_text[:250], re.IGNORECASE
-            )
-            start_index = 0
-            if match_start:
-                start_index = match_start.start() + len(target_phrase_start)
+    @staticmethod
+    def naming_pair(
+        page_data: KSAttributes, document: ParsedDocument
+    ) -> Optional[TwoTextsInput]:
+        """Наименование закупки и заголовок первой страницы документа."""
+        file_text = document.page(0)
+        if not file_text:
+            return None
 
-            target_phrase_end = "Общая информация об объекте закупки"
-            match_end = re.search(
-                target_phrase_end, file_text[:250], re.IGNORECASE
-            )
-            end_index = start_index + len(page_data.name) + 100
-            if match_end:
-                end_index = match_end.start()
+        match_start = patterns.TZ_TITLE.search(file_text, 0, 250)
+        start_index = 0
+        if match_start:
+            start_index = match_start.end()
 
-            pairs_to_compare = TwoTextsInput(
-                first=page_data.name, second=file_text[start_index:end_index]
-            )
+        match_end = patterns.GENERAL_INFO.search(file_text, 0, 250)
+        end_index = start_index + len(page_data.name) + 100
+        if match_end:
+            end_index = match_end.start()
 
-            similarity_score_fuzz = fuzz.partial_ratio(
-                page_data.name.lower(),
-                file_text[start_index:end_index].lower(),
-            )
-            if similarity_score_fuzz > 70:
-                return ValidationOptionResult(
-                    status=True, description=f"{similarity_score_fuzz}%"
-                )
+        return TwoTextsInput(
+            first=page_data.name, second=file_text[start_index:end_index]
+        )
 
-            tf1_score = self.model_requests.check_similarity_transformer(
-                pairs_to_compare
+    @staticmethod
+    def similarity_result(
+        scores: Optional[SimilarityScores],
+    ) -> Optional[ValidationOptionResult]:
+        """
+        Вердикт по векторным метрикам наименования: косинусное сходство,
+        затем евклидово расстояние; None - решение остаётся за LLM.
+        """
+        if scores is None:
+            return None
+        if scores.cosine >= 0.75:
+            return ValidationOptionResult(
+                status=True, description=f"{scores.cosine:.1%}"
             )
-            if tf1_score >= 0.75:
-                return ValidationOptionResult(
-                    status=True, description=f"{tf1_score:.1%}"
-                )
+        if scores.euclidean <= 4:
+            return ValidationOptionResult(
+                status=True, description=f"Отклонение {scores.euclidean}"
+            )
+        return None
 
-            tf2_score = self.model_requests.check_similarity2_transformer(
-                pairs_to_compare
+    def naming_pairs(self, page_data: KSAttributes) -> List[TwoTextsInput]:
+        pairs = [
+            self.naming_pair(page_data, document)
+            for document in self.naming_documents(page_data)
+        ]
+        return [pair for pair in pairs if pair is not None]
+
+    @staticmethod
+    def naming_fuzzy_result(
+        page_data: KSAttributes, pairs: List[TwoTextsInput]
+    ) -> Optional[ValidationOptionResult]:
+        """Нечёткое совпадение наименования с заголовком любого документа."""
+        index, score = best_match(
+            page_data.name, [pair.second for pair in pairs], score_cutoff=71
+        )
+        if index is None:
+            return None
+        return ValidationOptionResult(status=True, description=f"{score}%")
+
+    def validate_naming(
+        self, page_data: KSAttributes
+    ) -> ValidationOptionResult:
+        pairs = self.naming_pairs(page_data)
+        fuzzy_result = self.naming_fuzzy_result(page_data, pairs)
+        if fuzzy_result is not None:
+            return fuzzy_result
+        for pairs_to_compare in pairs:
+            result = self.similarity_result(
+                self.model_requests.similarity(pairs_to_compare)
             )
-            if tf2_score <= 4:
-                return ValidationOptionResult(
-                    status=True, description=f"Отклонение {tf2_score}"
-                )
+            if result is not None:
+                return result
 
             llama_verdict = self.model_requests.llama_prompt(pairs_to_compare)
             if llama_verdict:
@@ -302,92 +641,104 @@ class KSValidator:
             status=False, description="Упоминания не найдено"
         )
 
-    def validate_specifications(
-        self, api_data: KSAttributes
+    async def avalidate_naming(
+        self, page_data: KSAttributes
     ) -> ValidationOptionResult:
-        validation_checks = []
-        for file, file_text in zip(api_data.files, api_data.files_parsed):
-            if not (
-                "тз" in file["name"].lower()
-                or "т3" in file["name"].lower()
-                or (
-                    "техническое" in file["name"].lower()
-                    and "задание" in file["name"].lower()
-                )
-            ):
-                continue
-
-            deliveries = api_data.deliveries
-            from collections import defaultdict
-
-            aggregated_items = defaultdict(
-                lambda: {
-                    "sum": 0.0,
-                    "quantity": 0.0,
-                    "costPerUnit": 0.0,
-                    "name": "",
-                }
+        model_requests = self.async_model_requests
+        pairs = self.naming_pairs(page_data)
+        fuzzy_result = self.naming_fuzzy_result(page_data, pairs)
+        if fuzzy_result is not None:
+            return fuzzy_result
+        for pairs_to_compare in pairs:
+            result = self.similarity_result(
+                await model_requests.similarity(pairs_to_compare)
             )
+            if result is not None:
+                return result
 
-            for delivery in deliveries:
-                for item in delivery.get("items", []):
-                    name = item["name"]
-
-                    aggregated_items[name]["name"] = name
-                    aggregated_items[name]["sum"] += item["sum"]
-                    aggregated_items[name]["quantity"] += item["quantity"]
-                    aggregated_items[name]["costPerUnit"] = item["costPerUnit"]
-            unique_items = list(aggregated_items.values())
-
-            validated_items: List = []
+            if await model_requests.llama_prompt(pairs_to_compare):
+                return ValidationOptionResult(status=True, description="LLM")
 
-            normalized_text = re.sub(
-                r'[^a-zA-Zа-яА-Я0-9.,;:"\'\s-]', "", file_text
-            )
-            normalized_text = re.sub(r"\s+", " ", normalized_text)
-            full_pdf_spec_str = normalized_text.strip()
+        return ValidationOptionResult(
+            status=False, description="Упоминания не найдено"
+        )
 
-            unique_items_str = " ".join(
-                item for sublist in unique_items for item in sublist
-            )
-            normalized_text = re.sub(
-                r'[^a-zA-Zа-яА-Я0-9.,;:"\'\s-]', "", unique_items_str
-            )
-            normalized_text = re.sub(r"\s+", " ", normalized_text)
-            unique_items_str = normalized_text.strip()
+    @staticmethod
+    def specification_inputs(
+        api_data: KSAttributes,
+    ) -> Optional[Tuple[List[str], List[str]]]:
+        """Позиции поставок и фрагменты первого ТЗ закупки."""
+        for document in api_data.documents:
+            if document.role != DocumentRole.TECHNICAL_SPECIFICATION:
+                continue
+            items = specification_items(api_data.deliveries)
+            chunks = chunk_text(document.text)
+            if items and chunks:
+                return items, chunks
+            return None
+        return None
 
-            pairs_compare = TwoTextsInput(
-                first=unique_items_str.lower(),
-                second=full_pdf_spec_str.lower(),
-            )
+    @staticmethod
+    def specification_result(
+        matches: List[SpecificationMatch],
+    ) -> ValidationOptionResult:
+        found = sum(match.matched for match in matches)
+        status = found == len(matches)
+        return ValidationOptionResult(
+            status=status,
+            description=(
+                f"Спецификация {'' if status else 'не '}совпадает: "
+                f"найдено {found} из {len(matches)} позиций"
+            ),
+            matches=matches,
+        )
 
-            similarity_score = (
-                self.model_requests.check_similarity2_transformer(
-                    pairs_compare
-                )
+    def validate_specifications(
+        self, api_data: KSAttributes
+    ) -> ValidationOptionResult:
+        inputs = self.specification_inputs(api_data)
+        if inputs is None:
+            return ValidationOptionResult(
+                status=False, description="Спецификация не соответствует"
             )
+        items, chunks = inputs
+        threshold = settings.SPECIFICATION_THRESHOLD
+        matcher = ItemMatcher(self.model_requests.embed(items))
+        for offset, batch in chunk_batches(chunks):
+            matcher.update(self.model_requests.embed(batch), offset)
+            if matcher.all_matched(threshold):
+                break
+        return self.specification_result(
+            matcher.matches(items, chunks, threshold)
+        )
 
-            validation_checks.append(len(validated_items) == len(unique_items))
+    async def avalidate_specifications(
+        self, api_data: KSAttributes
+    ) -> ValidationOptionResult:
+        inputs = self.specification_inputs(api_data)
+        if inputs is None:
             return ValidationOptionResult(
-                status=similarity_score <= 5,
-                description=f"Спецификация {'не ' if similarity_score > 5 else ''}совпадает",
+                status=False, description="Спецификация не соответствует"
             )
-        return ValidationOptionResult(
-            status=False, description="Спецификация не соответствует"
+        items, chunks = inputs
+        model_requests = self.async_model_requests
+        threshold = settings.SPECIFICATION_THRESHOLD
+        matcher = ItemMatcher(await model_requests.embed(items))
+        for offset, batch in chunk_batches(chunks):
+            matcher.update(await model_requests.embed(batch), offset)
+            if matcher.all_matched(threshold):
+                break
+        return self.specification_result(
+            matcher.matches(items, chunks, threshold)
         )
 
     @staticmethod
     def validate_license(page_data: KSAttributes):
         license_text = page_data.isLicenseProduction
         if isinstance(license_text, bool):
-            for file_text in page_data.files_parsed:
-                if not file_text:
-                    continue
-                pattern1 = r"\s*лицензи\s*"
-                pattern2 = r"\s*сертификат\s*"
-                if re.search(pattern1, file_text) and re.search(
-                    pattern2, file_text
-                ):
+            for document in page_data.documents:
+                keywords = document.keywords
+                if keywords.has("license") and keywords.has("certificate"):
                     ValidationOptionResult(
                         status=True, description="Найдены совпадения"
                     )
@@ -396,30 +747,20 @@ class KSValidator:
             )
 
         else:
-            max_similarity = 0
-            for file_text in page_data.files_parsed:
+            windows = []
+            for document in page_data.documents:
+                file_text = document.text
                 if not file_text:
                     continue
-                licenses_indices = [
-                    i.start() for i in re.finditer("лицензи", file_text)
-                ]
-                certificate_indices = [
-                    i.start() for i in re.finditer("сертификат", file_text)
-                ]
+                licenses_indices = document.keywords.starts("license")
+                certificate_indices = document.keywords.starts("certificate")
                 for index in licenses_indices + certificate_indices:
                     start_index = max(0, index - 5)
                     end_index = min(
                         len(file_text), index + len(license_text) - 5
                     )
-                    substring = file_text[start_index:end_index]
-                    similarity_score = fuzz.partial_ratio(
-                        license_text.lower(), substring.lower()
-                    )
-                    max_similarity = max(max_similarity, similarity_score)
-                    if similarity_score > 80:
-                        return ValidationOptionResult(
-                            status=True, description=f"{max_similarity}%"
-                        )
+                    windows.append(file_text[start_index:end_index])
+            _, max_similarity = best_match(license_text, windows)
             return ValidationOptionResult(
-                status=False, description=f"{max_similarity}%"
+                status=max_similarity > 80, description=f"{max_similarity}%"
             )
@@ -0,0 +1,68 @@
+"""
+Сравнение задержки конвертации DOC/DOCX -> PDF: запуск soffice на каждый
+файл против пула долгоживущих процессов LibreOffice.
+
+Запуск из каталога app:
+    python -m benchmarks.bench_conversion путь/к/файлу.docx [...] --runs 5
+"""
+
+import argparse
+import shutil
+import statistics
+import time
+from pathlib import Path
+
+from analyze.converter import ConversionPool, uno
+from analyze.utils import convert_to_pdf, scratch_workspace
+
+
+def measure(convert, sources, runs, workspace):
+    latencies = []
+    for run in range(runs):
+        for index, source in enumerate(sources):
+            target = workspace / f"{run}_{index}{source.suffix}"
+            shutil.copy(source, target)
+            start = time.perf_counter()
+            convert(str(target))
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name, latencies):
+    print(
+        f"{name:<18} n={len(latencies):<4} "
+        f"mean={statistics.mean(latencies):.3f}s "
+        f"median={statistics.median(latencies):.3f}s "
+        f"max={max(latencies):.3f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("files", nargs="+", type=Path)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    with scratch_workspace("ks_bench_") as workspace:
+        report(
+            "spawn per file",
+            measure(convert_to_pdf, args.files, args.runs, workspace),
+        )
+        if uno is None:
+            print("pyuno недоступен, пул конвертеров не измерялся")
+            return
+        start = time.perf_counter()
+        pool = ConversionPool(args.workers, timeout=120)
+        print(f"pool startup       {time.perf_counter() - start:.3f}s")
+        try:
+            report(
+                "persistent pool",
+                measure(pool.convert, args.files, args.runs, workspace),
+            )
+        finally:
+            pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Время поиска шаблонов валидаторов в одном документе: шаблоны-строки,
+компилируемые при каждом вызове (как было в KSValidator), против
+заранее скомпилированных шаблонов и индекса ключевых слов.
+
+Сценарий повторяет поиски validate_price, validate_delivery_graphic
+(по всем поставкам), validate_perform_contract_required и
+validate_license. Режим registry - скомпилированные шаблоны
+analyze.patterns и прежние шаблоны лицензий и сроков из этого модуля;
+режим index - однопроходный индекс ключевых слов ParsedDocument.keywords.
+Режим "cold" сбрасывает кэш модуля re перед каждым документом, как это
+происходит, когда различных шаблонов больше, чем помещается в кэш re.
+
+Запуск из каталога app:
+    python -m benchmarks.bench_patterns --chars 200000 --deliveries 30
+"""
+
+import argparse
+import random
+import re
+import statistics
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Pattern
+
+from analyze import patterns
+from analyze.schemas import ParsedDocument
+
+WORDS = (
+    "поставка товара в течение 30 дней с 01.02.2024 по 28.02.2024 цена "
+    "стоимость контракта лицензия сертификат соответствия размер "
+    "обеспечения исполнения контракта составляет 10 000 рублей 00 копеек"
+).split()
+GUARANTEE = "10 000 (десять тысяч) рублей 00 (ноль) копеек"
+
+# Шаблоны, которые KSValidator использовал до индекса ключевых слов
+LICENSE = re.compile(r"\s*лицензи\s*")
+CERTIFICATE = re.compile(r"\s*сертификат\s*")
+LICENSE_WORD = re.compile("лицензи")
+CERTIFICATE_WORD = re.compile("сертификат")
+
+
+@lru_cache(maxsize=1024)
+def duration_pattern(days: int) -> Pattern:
+    return re.compile(rf"{days}\s*(?:[^\s\d].{{0,40}})?\s*(дней|дня|день)")
+
+
+def make_document(chars: int) -> str:
+    rng = random.Random(0)
+    words = []
+    size = 0
+    while size < chars:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+def scan_inline(text: str, durations) -> None:
+    list(
+        re.finditer(
+            r"\b(цена(?:ми|х|м|ми|у|ы|е|ой|ю)?|стоимость(?:ю|и|ям|ей|ями)?)\b",
+            text,
+            flags=re.IGNORECASE,
+        )
+    )
+    for duration in durations:
+        re.findall(r"\b(\d{2})[-.](\d{2})[-.](\d{4})\b", text)
+        for dur in range(max(1, duration - 1), duration + 2):
+            if re.findall(
+                rf"{dur}\s*(?:[^\s\d].{{0,40}})?\s*(дней|дня|день)", text
+            ):
+                break
+        re.findall(
+            rf"{duration // 28}\s*(?:[^\s\d].{{0,40}})?\s*(дней|дня|день)",
+            text,
+        )
+    re.search(
+        r"размер обеспечения исполнения Контракта составляет\s+\d+"
+        r"(?:\s\d+)*\sрублей\s\d{2}\sкопеек".lower(),
+        text,
+    )
+    re.search(
+        r"размер\s*обеспечения\s*исполнения\s*контракта\s*составляет\s*"
+        + re.escape(GUARANTEE),
+        text,
+    )
+    re.search(r"\s*лицензи\s*", text) and re.search(r"\s*сертификат\s*", text)
+    list(re.finditer("лицензи", text))
+    list(re.finditer("сертификат", text))
+
+
+def scan_registry(text: str, durations) -> None:
+    list(patterns.PRICE_WORDS.finditer(text))
+    for duration in durations:
+        patterns.DATE.findall(text)
+        for dur in range(max(1, duration - 1), duration + 2):
+            if duration_pattern(dur).search(text):
+                break
+        duration_pattern(duration // 28).search(text)
+    patterns.GUARANTEE_AMOUNT.search(text)
+    patterns.guarantee_pattern(GUARANTEE).search(text)
+    LICENSE.search(text) and CERTIFICATE.search(text)
+    list(LICENSE_WORD.finditer(text))
+    list(CERTIFICATE_WORD.finditer(text))
+
+
+def scan_index(text: str, durations) -> None:
+    document = ParsedDocument.from_text(text)
+    keywords = document.keywords
+    keywords.spans("price")
+    for duration in durations:
+        document.has_date_between(datetime(2024, 1, 1), datetime(2024, 3, 1))
+        candidates = {*range(max(1, duration - 1), duration + 2)}
+        candidates.isdisjoint(document.mentioned_days)
+        duration // 28 in document.mentioned_days
+    for start in keywords.starts("guarantee"):
+        patterns.GUARANTEE_AMOUNT.match(text, start)
+        patterns.guarantee_pattern(GUARANTEE).match(text, start)
+    keywords.has("license") and keywords.has("certificate")
+    keywords.starts("license")
+    keywords.starts("certificate")
+
+
+def measure(name, scan, documents, durations, cold):
+    timings = []
+    for text in documents:
+        if cold:
+            re.purge()
+        start = time.perf_counter()
+        scan(text, durations)
+        timings.append(time.perf_counter() - start)
+    print(
+        f"{name:<16} per document: "
+        f"median={statistics.median(timings) * 1000:.2f}ms "
+        f"mean={statistics.mean(timings) * 1000:.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chars", type=int, default=20_000)
+    parser.add_argument("--deliveries", type=int, default=30)
+    parser.add_argument("--documents", type=int, default=50)
+    args = parser.parse_args()
+
+    documents = [make_document(args.chars) for _ in range(args.documents)]
+    durations = [10 + index * 7 for index in range(args.deliveries)]
+    for cold in (False, True):
+        mode = "cold" if cold else "warm"
+        measure(f"inline ({mode})", scan_inline, documents, durations, cold)
+        measure(
+            f"registry ({mode})", scan_registry, documents, durations, cold
+        )
+        measure(f"index ({mode})", scan_index, documents, durations, cold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Сравнение сериализаторов Celery на аргументах start_analysis_task и
+результате Result: размер сообщения, время кодирования и декодирования.
+
+По умолчанию собирается синтетическая закупка с документами реального
+размера; вместо неё можно передать JSON, сохранённый из model_dump().
+
+Запуск из каталога app:
+    python -m benchmarks.bench_serialization --documents 8 --chars 300000
+    python -m benchmarks.bench_serialization --payload закупка.json
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+
+from analyze.schemas import (
+    DocumentRef,
+    KSAttributes,
+    ParsedDocument,
+    Result,
+    ValidationOption,
+    ValidationOptionResult,
+)
+from kombu.serialization import dumps, loads
+from serialization import SERIALIZER_NAME, register_serializer
+
+WORDS = (
+    "поставка товара техническое задание контракт цена стоимость рублей "
+    "копеек срок дней график наименование количество сертификат лицензия "
+    "обеспечение исполнения заказчик поставщик 2024 10 000 15 1 250"
+).split()
+
+
+def synthetic_page_data(documents: int, chars: int) -> KSAttributes:
+    rng = random.Random(0)
+    parsed = []
+    for index in range(documents):
+        words = []
+        size = 0
+        while size < chars:
+            word = rng.choice(WORDS)
+            words.append(word)
+            size += len(word) + 1
+        text = " ".join(words)
+        parsed.append(
+            ParsedDocument(
+                file_name=f"{index}.pdf",
+                raw_text=text,
+                text=text,
+                page_offsets=list(range(0, len(text), 3000)),
+                tables=[[["Товар", "10", "1 250,00"]] * 50],
+            )
+        )
+    return KSAttributes(
+        files=[
+            {"id": index, "name": document.file_name, "downloads_link": ""}
+            for index, document in enumerate(parsed)
+        ],
+        documents=parsed,
+        auction_id=123,
+        name="Поставка канцелярских товаров",
+        isContractGuaranteeRequired=False,
+        isLicenseProduction=False,
+        deliveries=[{"items": [{"name": "Бумага", "quantity": 10}]}] * 20,
+        startCost=100000.0,
+        contractCost=None,
+    )
+
+
+def analysis_result() -> dict:
+    return Result(
+        url="https://zakupki.mos.ru/auction/123",
+        name="Поставка канцелярских товаров",
+        analysis={
+            option: ValidationOptionResult(status=True, description="85%")
+            for option in ValidationOption
+        },
+    ).model_dump()
+
+
+def measure(name, payload, serializer, runs):
+    encode, decode = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        content_type, encoding, data = dumps(payload, serializer)
+        encode.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        loads(data, content_type, encoding)
+        decode.append(time.perf_counter() - start)
+    print(
+        f"{name:<24} {serializer:<13} size={len(data):>10} "
+        f"encode={statistics.median(encode) * 1000:8.2f}ms "
+        f"decode={statistics.median(decode) * 1000:8.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--payload", type=Path)
+    parser.add_argument("--documents", type=int, default=8)
+    parser.add_argument("--chars", type=int, default=300_000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    register_serializer()
+    if args.payload:
+        page_data = KSAttributes(**json.loads(args.payload.read_text()))
+    else:
+        page_data = synthetic_page_data(args.documents, args.chars)
+    inline = page_data.model_dump(mode="json")
+    refs = {
+        **inline,
+        "documents": [],
+        "document_refs": [
+            DocumentRef(
+                file_name=document.file_name,
+                role=document.role,
+                content_hash=hashlib.sha256(
+                    document.text.encode()
+                ).hexdigest(),
+                size=len(document.text),
+            ).model_dump(mode="json")
+            for document in page_data.documents
+        ],
+    }
+    payloads = {
+        "analysis args (inline)": ((inline, [1, 2, 3, 4, 5, 6], "url"), {}),
+        "analysis args (refs)": ((refs, [1, 2, 3, 4, 5, 6], "url"), {}),
+        "result": analysis_result(),
+    }
+    for name, payload in payloads.items():
+        for serializer in ("json", SERIALIZER_NAME):
+            measure(name, payload, serializer, args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,77 @@
 from typing import Dict, List
 
+from analyze.converter import shutdown_conversion_pool
+from analyze.document_store import get_document_store
+from analyze.http_client import run_async
 from analyze.schemas import KSAttributes, Result, ValidationOption
+from analyze.scraper import ingest_url
 from analyze.validation import KSValidator
 from celery import Celery
+from celery.signals import worker_process_shutdown, worker_shutdown
 from config import settings
+from serialization import SERIALIZER_NAME, register_serializer
 
 celery_app = Celery(
     "app", broker=settings.BROKER_URL, backend=settings.BACKEND_URL
 )
 
+register_serializer()
+
+# CELERY_SERIALIZER=msgpack_zstd включает компактный формат; принимаются
+# оба формата, чтобы воркеры можно было переключать по одному
 celery_app.conf.update(
-    task_serializer="json",
-    result_serializer="json",
-    accept_content=["json"],
+    task_serializer=settings.CELERY_SERIALIZER,
+    result_serializer=settings.CELERY_SERIALIZER,
+    accept_content=["json", SERIALIZER_NAME],
+    result_accept_content=["json", SERIALIZER_NAME],
     timezone="Europe/Moscow",
     enable_utc=True,
+    # Разбор документов - в отдельной очереди: её воркер работает с пулом
+    # потоков и может запускать пул процессов извлечения текста
+    task_routes={
+        "celery_app.ingest_url_task": {"queue": settings.INGEST_QUEUE}
+    },
 )
 
 ks_validator = KSValidator(settings.MODEL_URL)
 
 
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def close_conversion_pool(**kwargs) -> None:
+    shutdown_conversion_pool()
+
+
+@celery_app.task
+def ingest_url_task(url: str) -> Dict:
+    """
+    Скачивание и разбор закупки; результат передаётся в анализ.
+
+    Документы сохраняются в DocumentStore, через брокер передаются только
+    ссылки на них.
+    """
+    page_data = ingest_url(url)
+    if page_data is None:
+        raise ValueError(f"Не удалось получить данные закупки: {url}")
+    return get_document_store().store(page_data).model_dump()
+
+
 @celery_app.task
 def start_analysis_task(
     page_data: dict, validate_params: List[ValidationOption], url: str
 ) -> Dict:
-    analysis_result = ks_validator.validate_content(
-        KSAttributes(**page_data), validate_params
-    )
+    page_data = get_document_store().attach(KSAttributes(**page_data))
+    if settings.ASYNC_VALIDATION:
+        # Запросы к модели всех задач процесса выполняются в общем event
+        # loop, поэтому воркер можно запускать с пулом потоков
+        analysis_result = run_async(
+            ks_validator.avalidate_content(page_data, validate_params)
+        )
+    else:
+        analysis_result = ks_validator.validate_content(
+            page_data, validate_params
+        )
 
-    return Result(url=url, analysis=analysis_result).dict()
+    return Result(
+        url=url, name=page_data.name, analysis=analysis_result
+    ).dict()
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, List, Optional
 
 from pydantic_settings import BaseSettings
 
@@ -8,6 +8,56 @@ class Settings(BaseSettings):
     BACKEND_URL: Optional[str] = None
     DATABASE_URL: str
     MODEL_URL: str
+    HTTP_CONNECT_TIMEOUT: float = 5
+    HTTP_READ_TIMEOUT: float = 120
+    HTTP_RETRIES: int = 3
+    HTTP_BACKOFF_FACTOR: float = 0.5
+    HTTP_POOL_SIZE: int = 10
+    HTTP_HOST_POOL_SIZES: Dict[str, int] = {"zakupki.mos.ru": 16, "model": 32}
+    RATE_LIMITED_HOSTS: List[str] = ["zakupki.mos.ru"]
+    RATE_LIMIT_REDIS_URL: Optional[str] = None
+    RATE_LIMIT_RATE: float = 5
+    RATE_LIMIT_BURST: float = 10
+    RATE_LIMIT_MIN_RATE: float = 0.5
+    RATE_LIMIT_MAX_RATE: float = 20
+    RATE_LIMIT_MAX_CONCURRENCY: int = 8
+    RATE_LIMIT_TARGET_LATENCY: float = 3
+    DOWNLOAD_MAX_WORKERS: int = 8
+    DOWNLOAD_PER_HOST_LIMIT: int = 4
+    EXTRACTION_PROCESSES: Optional[int] = None
+    PDF_PAGES_PER_TASK: int = 20
+    EXTRACTION_MIN_BYTES: int = 2 * 1024 * 1024
+    INGEST_QUEUE: str = "ingest"
+    XLSX_MAX_ROWS: int = 100_000
+    XLSX_MAX_CELLS: int = 1_000_000
+    CONVERSION_WORKERS: int = 2
+    CONVERSION_TIMEOUT: float = 120
+    CONVERSION_START_TIMEOUT: float = 30
+    UNO_PATH: str = "/usr/lib/python3/dist-packages"
+    SCRATCH_DIR: Optional[str] = None
+    SPOOL_MAX_BYTES: int = 64 * 1024 * 1024
+    PARSED_CACHE_PATH: Optional[str] = "resources/parsed_cache.sqlite3"
+    PARSED_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    DOCUMENT_STORE_PATH: str = "resources/document_store.sqlite3"
+    DOCUMENT_STORE_TTL: int = 24 * 60 * 60
+    VALIDATION_WORKERS: int = 6
+    VALIDATION_TIMEOUT: float = 300
+    VALIDATION_TIMEOUTS: Dict[str, float] = {}
+    ASYNC_VALIDATION: bool = False
+    PRICE_TOLERANCE: float = 0.001
+    PRICE_WINDOW_MAX_CHARS: int = 400
+    LLM_CONCURRENCY: int = 4
+    FUZZY_WORKERS: int = -1
+    SPECIFICATION_CHUNK_WORDS: int = 48
+    SPECIFICATION_CHUNK_OVERLAP: int = 12
+    SPECIFICATION_THRESHOLD: float = 0.6
+    EMBED_BATCH_SIZE: int = 64
+    CELERY_SERIALIZER: str = "json"
+    SERIALIZER_COMPRESS_THRESHOLD: int = 1024
+    SERIALIZER_COMPRESS_LEVEL: int = 3
+    AUCTION_CACHE_TTL: int = 300
+    AUCTION_CACHE_MAX_AGE: int = 24 * 60 * 60
+    AUCTION_CACHE_REDIS_URL: Optional[str] = None
 
     class Config:
         env_file = ".env"
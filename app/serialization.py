@@ -0,0 +1,80 @@
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+
+import msgpack
+from config import settings
+from kombu.serialization import register
+from pydantic import BaseModel
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SERIALIZER_NAME = "msgpack_zstd"
+CONTENT_TYPE = "application/x-ks-msgpack"
+
+# Первый байт сообщения: как сжато тело после него
+PLAIN = b"\x00"
+ZSTD = b"\x01"
+ZLIB = b"\x02"
+
+
+def _default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _compress(data: bytes) -> bytes:
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(
+            level=settings.SERIALIZER_COMPRESS_LEVEL
+        )
+        return ZSTD + compressor.compress(data)
+    return ZLIB + zlib.compress(data, settings.SERIALIZER_COMPRESS_LEVEL)
+
+
+def dumps(value) -> bytes:
+    """
+    msgpack; тело больше SERIALIZER_COMPRESS_THRESHOLD байт сжимается
+    zstd (или zlib, если zstandard не установлен).
+    """
+    data = msgpack.packb(value, default=_default, use_bin_type=True)
+    if len(data) > settings.SERIALIZER_COMPRESS_THRESHOLD:
+        return _compress(data)
+    return PLAIN + data
+
+
+def loads(payload: bytes):
+    flag, data = payload[:1], payload[1:]
+    if flag == ZSTD:
+        if zstandard is None:
+            raise ValueError("zstandard is required to decode the message")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif flag == ZLIB:
+        data = zlib.decompress(data)
+    elif flag != PLAIN:
+        raise ValueError(f"Unknown message flag: {flag!r}")
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+def register_serializer() -> None:
+    """Регистрирует сериализатор в kombu под именем SERIALIZER_NAME."""
+    register(
+        SERIALIZER_NAME,
+        dumps,
+        loads,
+        content_type=CONTENT_TYPE,
+        content_encoding="binary",
+    )
@@ -1,12 +1,25 @@
 # test_analyze.py
+import asyncio
 import io
 import json
 import os
+import re
 import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import httpx
+import numpy as np
+import openpyxl
 import pytest
+import redis
+import requests
 from sqlalchemy.orm import Session
 
 # Добавляем корень проекта в PYTHONPATH
@@ -15,38 +28,92 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 os.environ["DATABASE_URL"] = "sqlite:///:memory:"
 os.environ["BROKER_URL"] = "memory://"
 os.environ["MODEL_URL"] = "http://mock-model"
+# Кэши на диске - во временном каталоге, а не в resources/ рабочего каталога
+_resources_dir = tempfile.mkdtemp(prefix="ks_tests_")
+os.environ["PARSED_CACHE_PATH"] = os.path.join(
+    _resources_dir, "parsed_cache.sqlite3"
+)
+os.environ["DOCUMENT_STORE_PATH"] = os.path.join(
+    _resources_dir, "document_store.sqlite3"
+)
 
+from analyze import patterns, utils
+from analyze.api import analyze_url
 from analyze.api import router as analyze_router
 from analyze.api_utils import (
     clear_task_history_user,
     create_new_tasks,
     get_tasks_by_user_token,
-    process_data,
     process_task,
     send_task_email,
 )
+from analyze.cache import AuctionMetadataCache, ParsedDocumentCache
+from analyze.converter import (
+    ConversionPool,
+    get_conversion_pool,
+    shutdown_conversion_pool,
+)
+from analyze.document_store import DocumentStore
+from analyze.fuzzy import best_match
+from analyze.http_client import (
+    arequest,
+    build_async_client,
+    build_session,
+    get_session,
+    run_async,
+)
+from analyze.patterns import guarantee_pattern
+from analyze.prices import classify_window, spelled_amounts
+from analyze.rate_limiter import (
+    AdaptiveLimiter,
+    TokenBucket,
+    call_limited,
+    get_host_limiter,
+)
 from analyze.schemas import (
     AnalyzeUrlRequest,
     AnalyzeUrlResponse,
+    DocumentRole,
     KSAttributes,
+    ParsedDocument,
+    Result,
+    SimilarityScores,
     TwoTextsInput,
     ValidationOption,
     ValidationOptionResult,
 )
-from analyze.scraper import FilesProcessor, ParserWeb
+from analyze.scraper import FilesProcessor, ParserWeb, ingest_url
+from analyze.specifications import chunk_text
 from analyze.utils import (
     clear_text,
+    convert_document,
     convert_to_pdf,
+    extract_pdf_pages,
     extract_text_from_file,
     extract_text_from_pdf,
     extract_text_from_xlsx,
+    get_extraction_pool,
+    iter_xlsx_rows,
+    parse_stream,
     read_file,
+    scratch_workspace,
+    shared_file,
 )
 
 # Импортируем тестируемые модули
-from analyze.validation import KSValidator, ModelRequest
+from analyze.validation import AsyncModelRequest, KSValidator, ModelRequest
 from celery.result import AsyncResult
+from celery_app import ingest_url_task
 from db.models import TaskHistory, User
+from kombu.serialization import dumps as kombu_dumps
+from kombu.serialization import loads as kombu_loads
+from serialization import (
+    PLAIN,
+    SERIALIZER_NAME,
+    dumps,
+    loads,
+    register_serializer,
+)
 
 
 # Фикстуры для тестовых данных
@@ -85,6 +152,73 @@ def mock_page_data():
     )
 
 
+def make_pdf(page_texts):
+    """Собирает минимальный PDF с одной строкой текста на странице."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for text in page_texts:
+        content = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream"
+            % (len(content), content)
+        )
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % len(objects)
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = (
+        f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+    )
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF" % (
+        len(objects) + 1,
+        xref,
+    )
+    return pdf
+
+
+def make_docx(body, header="", footer=""):
+    """Собирает DOCX из готовых XML-фрагментов тела и колонтитулов."""
+    namespace = (
+        'xmlns:w="http://schemas.openxmlformats.org/'
+        'wordprocessingml/2006/main"'
+    )
+    stream = io.BytesIO()
+    with zipfile.ZipFile(stream, "w") as archive:
+        archive.writestr(
+            "word/document.xml",
+            f"<w:document {namespace}><w:body>{body}</w:body></w:document>",
+        )
+        if header:
+            archive.writestr(
+                "word/header1.xml", f"<w:hdr {namespace}>{header}</w:hdr>"
+            )
+        if footer:
+            archive.writestr(
+                "word/footer1.xml", f"<w:ftr {namespace}>{footer}</w:ftr>"
+            )
+    return stream.getvalue()
+
+
+def docx_paragraph(text):
+    return f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>"
+
+
 @pytest.fixture
 def mock_user():
     return User(id=1, email="test@example.com", token="test_token")
@@ -109,8 +243,10 @@ class TestKSValidator:
 
         # Настраиваем моки для методов модели
         mock_model_request.llama_prompt.return_value = True
-        mock_model_request.check_similarity_transformer.return_value = 0.8
-        mock_model_request.check_similarity2_transformer.return_value = 3.0
+        mock_model_request.similarity.return_value = SimilarityScores(
+            cosine=0.8, euclidean=3.0, dot=1.0
+        )
+        mock_model_request.embed.return_value = np.ones((1, 4))
 
         # Тестируем все варианты валидации
         results = validator.validate_content(
@@ -130,64 +266,194 @@ class TestKSValidator:
             isinstance(v, ValidationOptionResult) for v in results.values()
         )
 
-    def test_validate_naming(self, mock_page_data):
-        """Тест валидации наименования"""
-        validator = KSValidator("url")
+    def test_validate_content_parallel(self, mock_page_data):
+        """Тест: проверки идут параллельно, с таймаутом и ошибками"""
+        validator = KSValidator()
 
-        with patch.object(
-            validator.model_requests,
-            "check_similarity_transformer",
-            return_value=0.85,
+        def slow(page_data):
+            time.sleep(0.3)
+            return ValidationOptionResult(status=True, description="ok")
+
+        def hung(page_data):
+            time.sleep(1)
+            return ValidationOptionResult(status=True, description="late")
+
+        def broken(page_data):
+            raise RuntimeError("model unavailable")
+
+        validator.validation_checks = {
+            ValidationOption.VALIDATE_NAMING: slow,
+            ValidationOption.VALIDATE_PRICE: slow,
+            ValidationOption.VALIDATE_LICENSE: hung,
+            ValidationOption.VALIDATE_SPECIFICATIONS: broken,
+        }
+        with patch.multiple(
+            "analyze.validation.settings",
+            VALIDATION_WORKERS=4,
+            VALIDATION_TIMEOUTS={"VALIDATE_LICENSE": 0.5},
         ):
-            result = validator.validate_naming(mock_page_data)
-            assert result.status is True
+            start = time.monotonic()
+            results = validator.validate_content(
+                mock_page_data, list(validator.validation_checks)
+            )
+            elapsed = time.monotonic() - start
 
-        with patch.object(
-            validator.model_requests,
-            "check_similarity_transformer",
-            return_value=0.65,
+        assert elapsed < 0.9
+        assert list(results) == list(validator.validation_checks)
+        assert results[ValidationOption.VALIDATE_NAMING].status is True
+        assert results[ValidationOption.VALIDATE_PRICE].status is True
+        assert results[ValidationOption.VALIDATE_LICENSE].description == (
+            "Превышено время проверки"
+        )
+        assert (
+            results[ValidationOption.VALIDATE_SPECIFICATIONS].status is False
+        )
+
+    def test_validate_content_inline_errors(self, mock_page_data):
+        """Тест: без пула упавшая проверка не прерывает остальные"""
+        validator = KSValidator()
+
+        def broken(page_data):
+            raise RuntimeError("model is down")
+
+        validator.validation_checks[ValidationOption.VALIDATE_PRICE] = broken
+        for workers, options in (
+            (1, [ValidationOption.VALIDATE_PRICE]),
+            (
+                1,
+                [
+                    ValidationOption.VALIDATE_PRICE,
+                    ValidationOption.VALIDATE_LICENSE,
+                ],
+            ),
+            (6, [ValidationOption.VALIDATE_PRICE]),
         ):
-            with patch.object(
-                validator.model_requests,
-                "check_similarity2_transformer",
-                return_value=3,
+            with patch(
+                "analyze.validation.settings.VALIDATION_WORKERS", workers
             ):
-                result = validator.validate_naming(mock_page_data)
-                assert result.status is True
+                results = validator.validate_content(mock_page_data, options)
+            assert results[ValidationOption.VALIDATE_PRICE] == (
+                ValidationOptionResult(
+                    status=False, description="Ошибка проверки"
+                )
+            )
+            assert len(results) == len(options)
 
-        with patch.object(
-            validator.model_requests,
-            "check_similarity_transformer",
-            return_value=0.65,
+    def test_avalidate_content(self, mock_page_data):
+        """Тест асинхронных проверок в общем фоновом event loop"""
+        validator = KSValidator("http://mock-model")
+        model_requests = validator.async_model_requests
+
+        async def slow_llama(prompt):
+            await asyncio.sleep(1)
+            return True
+
+        mock_page_data.documents = [
+            ParsedDocument.from_text("Test Purchase цена 100", "ТЗ.pdf")
+        ]
+        with patch.multiple(
+            model_requests,
+            embed=AsyncMock(return_value=np.ones((1, 4))),
+            llama_prompt=slow_llama,
+        ), patch(
+            "analyze.validation.settings.VALIDATION_TIMEOUTS",
+            {"VALIDATE_PRICE": 0.2},
         ):
-            with patch.object(
-                validator.model_requests,
-                "check_similarity2_transformer",
-                return_value=5,
-            ):
-                with patch.object(
-                    validator.model_requests, "llama_prompt", return_value=True
-                ):
-                    result = validator.validate_naming(mock_page_data)
-                    assert result.status is True
+            results = run_async(
+                validator.avalidate_content(
+                    mock_page_data,
+                    [
+                        ValidationOption.VALIDATE_NAMING,
+                        ValidationOption.VALIDATE_PRICE,
+                        ValidationOption.VALIDATE_SPECIFICATIONS,
+                        ValidationOption.VALIDATE_LICENSE,
+                    ],
+                ),
+                timeout=5,
+            )
 
-        with patch.object(
-            validator.model_requests,
-            "check_similarity_transformer",
-            return_value=0.65,
+        assert results[ValidationOption.VALIDATE_NAMING].status is True
+        assert results[ValidationOption.VALIDATE_PRICE].description == (
+            "Превышено время проверки"
+        )
+        assert results[ValidationOption.VALIDATE_SPECIFICATIONS].status
+        assert results[ValidationOption.VALIDATE_LICENSE].status is False
+
+    @pytest.mark.asyncio
+    async def test_async_model_request(self):
+        """Тест асинхронного запроса к сервису модели"""
+        client = httpx.AsyncClient(
+            transport=httpx.MockTransport(
+                lambda request: httpx.Response(200, json={"result": "0.9"})
+            )
+        )
+        model_requests = AsyncModelRequest("http://model")
+        pair = TwoTextsInput(first="a", second="b")
+
+        with patch(
+            "analyze.http_client.get_async_client", return_value=client
         ):
+            score = await model_requests.check_similarity_transformer(pair)
+
+        assert score == 0.9
+
+    @pytest.mark.asyncio
+    async def test_async_model_request_connect_error(self):
+        """Тест: недоступный сервис модели не прерывает async-проверку"""
+
+        def handler(request):
+            raise httpx.ConnectError("refused", request=request)
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        model_requests = AsyncModelRequest("http://model")
+
+        with patch(
+            "analyze.http_client.get_async_client", return_value=client
+        ), patch("analyze.http_client.settings.HTTP_BACKOFF_FACTOR", 0):
+            result = await model_requests.post_request("embed", {})
+
+        assert result is None
+
+    def test_validate_naming(self, mock_page_data):
+        """Тест валидации наименования"""
+        validator = KSValidator("url")
+        cases = [
+            (SimilarityScores(cosine=0.85, euclidean=5, dot=1), False, True),
+            (SimilarityScores(cosine=0.65, euclidean=3, dot=1), False, True),
+            (SimilarityScores(cosine=0.65, euclidean=5, dot=1), True, True),
+            (SimilarityScores(cosine=0.65, euclidean=5, dot=1), False, False),
+            (None, True, True),
+        ]
+        for scores, llama_verdict, status in cases:
             with patch.object(
+                validator.model_requests, "similarity", return_value=scores
+            ) as similarity, patch.object(
                 validator.model_requests,
-                "check_similarity2_transformer",
-                return_value=5,
+                "llama_prompt",
+                return_value=llama_verdict,
             ):
-                with patch.object(
-                    validator.model_requests,
-                    "llama_prompt",
-                    return_value=False,
-                ):
-                    result = validator.validate_naming(mock_page_data)
-                    assert result.status is False
+                result = validator.validate_naming(mock_page_data)
+            assert result.status is status
+            similarity.assert_called_once()
+
+    def test_similarity_request(self):
+        """Тест: все метрики сходства приходят одним запросом"""
+        model_requests = ModelRequest("http://model")
+        response = MagicMock()
+        response.json.return_value = {
+            "result": {"cosine": 0.9, "euclidean": 1.5, "dot": 12.0}
+        }
+        session = MagicMock()
+        session.post.return_value = response
+        pair = TwoTextsInput(first="a", second="b")
+
+        with patch("analyze.validation.get_session", return_value=session):
+            scores = model_requests.similarity(pair)
+
+        assert scores == SimilarityScores(cosine=0.9, euclidean=1.5, dot=12.0)
+        session.post.assert_called_once_with(
+            "http://model/similarity", json={"first": "a", "second": "b"}
+        )
 
     def test_validate_price(self, mock_page_data):
         """Тест валидации цены"""
@@ -199,6 +465,139 @@ class TestKSValidator:
             result = validator.validate_price(mock_page_data)
             assert result.status is False
 
+    def test_validate_price_numeric(self, mock_page_data):
+        """Тест: сумма в тексте сравнивается с ценой без обращения к LLM"""
+        validator = KSValidator("url")
+        mock_page_data.startCost = 1250000.0
+        mock_page_data.contractCost = None
+        texts = {
+            "начальная цена контракта 1 250 00000 руб": True,
+            "цена контракта один миллион двести пятьдесят тысяч": True,
+            "цена контракта составляет 990 000 рублей": False,
+        }
+        for text, status in texts.items():
+            mock_page_data.documents = [ParsedDocument.from_text(text)]
+            with patch.object(
+                validator.model_requests, "llama_prompt"
+            ) as llama_prompt:
+                result = validator.validate_price(mock_page_data)
+            assert result.status is status
+            assert "numeric" in result.description
+            llama_prompt.assert_not_called()
+
+    def test_classify_window_spelled_amount(self):
+        """Тест: сумма прописью сравнивается целыми словами как число"""
+        texts = [
+            ("цена контракта два миллиона пятьсот тысяч рублей", 2000000.0),
+            ("стоимость товара указана в приложении", 100.0),
+        ]
+        for text, target in texts:
+            assert classify_window(text, 0, len(text), [target], 0.001) is None
+
+        text = "цена контракта два миллиона пятьсот тысяч рублей"
+        assert spelled_amounts(text, 0, 20) == {2500000}
+        assert classify_window(text, 0, 20, [2500000.0], 0.001) is True
+
+    def test_validate_price_llm(self, mock_page_data):
+        """Тест: LLM получает только окна без сумм"""
+        validator = KSValidator("url")
+        mock_page_data.documents = [
+            ParsedDocument.from_text("стоимость 10 рублей"),
+            ParsedDocument.from_text("цена указана в приложении"),
+        ]
+        with patch.object(
+            validator.model_requests, "llama_prompt", return_value=True
+        ) as llama_prompt:
+            result = validator.validate_price(mock_page_data)
+        assert result.status is True
+        assert result.description == "Упоминание найдено (LLM)"
+        llama_prompt.assert_called_once()
+        assert "указана" in llama_prompt.call_args[0][0].second
+
+    def test_price_windows_merged(self, mock_page_data):
+        """Тест: соседние окна объединяются, одинаковые - один запрос"""
+        validator = KSValidator("url")
+        text = "цена и стоимость указаны в приложении"
+        document = ParsedDocument.from_text(text)
+        assert validator.price_windows(document) == [(0, len(text) - 1)]
+        mock_page_data.documents = [
+            ParsedDocument.from_text(text),
+            ParsedDocument.from_text(text),
+        ]
+        found, prompts = validator.price_prompts(mock_page_data)
+        assert found is False
+        assert len(prompts) == 1
+
+    def test_price_windows_capped(self):
+        """Тест: длинная цепочка упоминаний цены делится на окна"""
+        validator = KSValidator("url")
+        text = "позиция: цена указана в таблице. " * 200
+        document = ParsedDocument.from_text(text)
+        with patch("analyze.validation.settings.PRICE_WINDOW_MAX_CHARS", 300):
+            windows = validator.price_windows(document)
+
+        assert len(windows) > 1
+        assert all(end - start <= 300 for start, end in windows)
+        assert windows[0][0] == 0
+        assert windows[-1][1] == len(text) - 1
+        # Окна покрывают все упоминания без разрывов
+        assert all(
+            start <= previous_end
+            for (_, previous_end), (start, _) in zip(windows, windows[1:])
+        )
+
+    def test_validate_price_concurrent(self, mock_page_data):
+        """Тест: запросы к LLM идут одновременно до первого ответа yes"""
+        validator = KSValidator("url")
+        mock_page_data.documents = [
+            ParsedDocument.from_text(
+                f"цена указана в приложении {index} к контракту"
+            )
+            for index in ("а", "б", "в")
+        ]
+
+        def llama_prompt(prompt):
+            if " б " in prompt.second:
+                return True
+            time.sleep(0.3)
+            return False
+
+        with patch.object(
+            validator.model_requests, "llama_prompt", side_effect=llama_prompt
+        ):
+            start = time.perf_counter()
+            result = validator.validate_price(mock_page_data)
+            elapsed = time.perf_counter() - start
+        assert result.status is True
+        assert result.description == "Упоминание найдено (LLM)"
+        assert elapsed < 0.3
+
+    def test_avalidate_price_cancels(self, mock_page_data):
+        """Тест: после первого ответа yes остальные запросы отменяются"""
+        validator = KSValidator("url")
+        mock_page_data.documents = [
+            ParsedDocument.from_text(
+                f"цена указана в приложении {index} к контракту"
+            )
+            for index in ("а", "б", "в")
+        ]
+        cancelled = []
+
+        async def llama_prompt(prompt):
+            if " б " in prompt.second:
+                return True
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(prompt.second)
+                raise
+            return False
+
+        validator.async_model_requests.llama_prompt = llama_prompt
+        result = asyncio.run(validator.avalidate_price(mock_page_data))
+        assert result.status is True
+        assert len(cancelled) == 2
+
     def test_validate_delivery_graphic(self, mock_page_data):
         """Тест валидации графика поставки"""
         validator = KSValidator()
@@ -213,14 +612,125 @@ class TestKSValidator:
         result = validator.validate_delivery_graphic(invalid_data)
         assert result.status is False
 
+        # Тест: срок "N дней" из документа засчитывается
+        mock_page_data.documents = [
+            ParsedDocument.from_text("поставка в течение 30 дней")
+        ]
+        mock_page_data.deliveries = [
+            {
+                "periodDateFrom": None,
+                "periodDateTo": None,
+                "periodDaysFrom": 1,
+                "periodDaysTo": 31,
+            }
+        ]
+        result = validator.validate_delivery_graphic(mock_page_data)
+        assert result.status is True
+
+    def test_validate_perform_contract_required(self, mock_page_data):
+        """Тест поиска суммы обеспечения прописью"""
+        validator = KSValidator()
+        mock_page_data.isContractGuaranteeRequired = 1500.5
+        phrase = validator.number_to_words(1500.5).lower()
+        mock_page_data.documents = [
+            ParsedDocument.from_text(
+                f"размер обеспечения исполнения контракта составляет {phrase}"
+            )
+        ]
+
+        result = validator.validate_perform_contract_required(mock_page_data)
+
+        assert result.status is True
+        assert guarantee_pattern(phrase) is guarantee_pattern(phrase)
+
+    def test_validate_specifications(self, mock_page_data):
+        """Тест: каждая позиция сравнивается с фрагментами ТЗ"""
+        validator = KSValidator("url")
+        mock_page_data.deliveries = [
+            {"items": [{"name": "Бумага А4"}, {"name": "Ручка"}]},
+            {"items": [{"name": "Бумага А4"}]},
+        ]
+        mock_page_data.documents = [
+            ParsedDocument.from_text("слово " * 100, "ТЗ.pdf")
+        ]
+        vectors = {
+            "бумага а4": [1.0, 0.0],
+            "ручка": [0.0, 1.0],
+        }
+        requests = []
+
+        def embed(texts):
+            requests.append(len(texts))
+            if texts[0] in vectors:
+                return np.array([vectors[text] for text in texts])
+            # Бумага найдена в первом фрагменте, ручка - нигде
+            return np.array([[1.0, 0.0]] + [[0.6, 0.0]] * (len(texts) - 1))
+
+        with patch.object(
+            validator.model_requests, "embed", side_effect=embed
+        ), patch("analyze.specifications.settings.EMBED_BATCH_SIZE", 2):
+            result = validator.validate_specifications(mock_page_data)
+
+        assert (
+            chunk_text("слово " * 100)
+            == validator.specification_inputs(mock_page_data)[1]
+        )
+        assert requests == [2, 2, 1]
+        assert result.status is False
+        assert result.description == (
+            "Спецификация не совпадает: найдено 1 из 2 позиций"
+        )
+        assert [match.matched for match in result.matches] == [True, False]
+        assert result.matches[0].fragment.startswith("слово")
+
+    def test_chunk_text(self):
+        """Тест нарезки ТЗ на перекрывающиеся фрагменты"""
+        text = " ".join(str(index) for index in range(10))
+
+        assert chunk_text(text, words=4, overlap=1) == [
+            "0 1 2 3",
+            "3 4 5 6",
+            "6 7 8 9",
+        ]
+        assert chunk_text("", words=4, overlap=1) == []
+
+    def test_validate_license(self, mock_page_data):
+        """Тест нечёткого поиска лицензии среди всех упоминаний"""
+        validator = KSValidator()
+        mock_page_data.isLicenseProduction = "Лицензия на производство"
+        mock_page_data.documents = [
+            ParsedDocument.from_text("лицензию не требуется " * 200),
+            ParsedDocument.from_text(
+                "поставщик обязан иметь лицензия на производство товара"
+            ),
+        ]
+
+        result = validator.validate_license(mock_page_data)
+
+        assert result.status is True
+
+        mock_page_data.documents = mock_page_data.documents[:1]
+        result = validator.validate_license(mock_page_data)
+
+        assert result.status is False
+
+    def test_best_match(self):
+        """Тест пакетной нечёткой оценки окон"""
+        windows = ["совсем другой текст", "поставка Бумаги а4", "бумага"]
+
+        assert best_match("Поставка бумаги", windows) == (1, 100)
+        assert best_match("Поставка бумаги", []) == (None, 0)
+        assert best_match("xyz", windows, score_cutoff=90)[0] is None
+
 
 # Тесты для ParserWeb
 class TestParserWeb:
     """Тесты для парсера веб-страниц"""
 
-    @patch("requests.get")
-    def test_is_real_url(self, mock_get):
+    @patch("analyze.scraper.get_session")
+    def test_is_real_url(self, mock_session):
         """Тест проверки существования URL"""
+        mock_get = mock_session.return_value.get
         mock_get.return_value.status_code = 200
         parser = ParserWeb("http://example.com")
         assert parser.is_real_url() is True
@@ -228,9 +738,10 @@ class TestParserWeb:
         mock_get.return_value.status_code = 404
         assert parser.is_real_url() is False
 
-    @patch("requests.get")
-    def test_get_attributes_ks(self, mock_get):
+    @patch("analyze.scraper.get_session")
+    def test_get_attributes_ks(self, mock_session):
         """Тест получения атрибутов конкурсной ситуации"""
+        mock_get = mock_session.return_value.get
         test_data = {
             "name": "Test Purchase",
             "files": [{"name": "test.pdf", "id": "123"}],
@@ -252,28 +763,655 @@ class TestParserWeb:
         assert result.auction_id == 123
 
 
-# Тесты для API utils
-class TestAPIUtils:
-    """Тесты для вспомогательных функций API"""
+class FakeOfficeWorker:
+    """Заглушка процесса soffice для тестов пула конвертеров."""
 
-    @patch("analyze.scraper.ParserWeb")
-    @patch("analyze.scraper.FilesProcessor")
-    def test_process_data(
-        self, mock_files_processor, mock_parser_web, mock_page_data
+    def __init__(self, index):
+        self.index = index
+        self.job_started = None
+        self.running = False
+        self.profile_dir = Path("/nonexistent")
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def restart(self):
+        self.running = True
+
+    def is_healthy(self):
+        return self.running
+
+    def convert(self, input_path, output_path):
+        if input_path.stem == "hang":
+            while self.running:
+                time.sleep(0.05)
+            raise RuntimeError("soffice killed")
+        output_path.write_bytes(b"%PDF")
+
+
+# Тесты для конвертации документов
+class TestConversion:
+    """Тесты для пула конвертеров LibreOffice"""
+
+    @patch("analyze.converter.OfficeWorker", FakeOfficeWorker)
+    def test_pool_converts_and_kills_hung_jobs(self, tmp_path):
+        """Тест конвертации и прерывания зависшего задания"""
+        pool = ConversionPool(workers=2, timeout=1)
+        source = tmp_path / "doc.docx"
+        source.write_bytes(b"docx")
+
+        assert pool.convert(str(source)) == tmp_path / "doc.pdf"
+        assert (tmp_path / "doc.pdf").exists()
+
+        with pytest.raises(RuntimeError):
+            pool.convert(str(tmp_path / "hang.doc"))
+        time.sleep(0.1)
+        assert pool.health() == [True, True]
+
+    @patch("analyze.converter.OfficeWorker", FakeOfficeWorker)
+    def test_pool_timeout_excludes_queue_wait(self, tmp_path):
+        """Тест: ожидание в очереди не входит в таймаут задания"""
+        pool = ConversionPool(workers=1, timeout=0.5)
+        source = tmp_path / "doc.docx"
+        source.write_bytes(b"docx")
+        hung = ThreadPoolExecutor(max_workers=1).submit(
+            pool.convert, str(tmp_path / "hang.doc")
+        )
+        time.sleep(0.1)
+
+        # Зависшее задание держит единственный воркер дольше timeout
+        assert pool.convert(str(source)) == tmp_path / "doc.pdf"
+        with pytest.raises(RuntimeError):
+            hung.result()
+
+    @patch("analyze.converter.OfficeWorker", FakeOfficeWorker)
+    def test_pool_close_cancels_queued_jobs(self, tmp_path):
+        """Тест: закрытие пула отменяет задания в очереди"""
+        pool = ConversionPool(workers=1, timeout=5)
+        executor = ThreadPoolExecutor(max_workers=2)
+        hung = executor.submit(pool.convert, str(tmp_path / "hang.doc"))
+        time.sleep(0.1)
+        queued = executor.submit(pool.convert, str(tmp_path / "doc.docx"))
+        time.sleep(0.1)
+
+        pool.close()
+
+        with pytest.raises(CancelledError):
+            queued.result(timeout=1)
+        with pytest.raises(RuntimeError):
+            hung.result(timeout=1)
+        with pytest.raises(RuntimeError):
+            pool.convert(str(tmp_path / "doc.docx"))
+
+    @patch("analyze.converter.convert_to_pdf")
+    @patch("analyze.converter.OfficeWorker", FakeOfficeWorker)
+    def test_pool_falls_back_when_restart_fails(self, mock_convert, tmp_path):
+        """Тест: если soffice не поднялся, файл конвертируется разово"""
+        pool = ConversionPool(workers=1, timeout=1)
+        worker = pool.workers[0]
+        worker.running = False
+        worker.restart = MagicMock(side_effect=RuntimeError("no soffice"))
+        mock_convert.return_value = (None, tmp_path / "doc.pdf")
+
+        assert pool.convert(str(tmp_path / "doc.doc")) == tmp_path / "doc.pdf"
+        mock_convert.assert_called_once_with(str(tmp_path / "doc.doc"))
+
+    @patch("analyze.converter.OfficeWorker", FakeOfficeWorker)
+    def test_shutdown_conversion_pool(self):
+        """Тест: при завершении процесса soffice останавливаются"""
+        with patch("analyze.converter.uno", MagicMock()), patch(
+            "analyze.converter._pool_pid", None
+        ), patch("analyze.converter._pool", None):
+            pool = get_conversion_pool()
+            assert pool.health() == [True] * len(pool.workers)
+
+            shutdown_conversion_pool()
+
+            assert pool.closed
+            assert pool.health() == [False] * len(pool.workers)
+
+    @patch("analyze.utils.convert_to_pdf")
+    @patch("analyze.utils.get_conversion_pool")
+    def test_convert_document_fallback(self, mock_pool, mock_convert):
+        """Тест: без пула документ конвертируется запуском soffice"""
+        mock_pool.return_value = None
+        mock_convert.return_value = (None, Path("a.pdf"))
+        assert convert_document("a.docx") == Path("a.pdf")
+
+        mock_pool.return_value = MagicMock()
+        mock_pool.return_value.convert.return_value = Path("b.pdf")
+        assert convert_document("b.docx") == Path("b.pdf")
+
+
+# Тесты для HTTP-клиента
+class TestHttpClient:
+    """Тесты для общего HTTP-клиента"""
+
+    def test_session_shared_and_pooled(self):
+        """Тест общей сессии с пулами по хостам и таймаутами"""
+        assert get_session() is get_session()
+
+        session = build_session()
+        assert session.timeout == (5, 120)
+        adapter = session.get_adapter("https://zakupki.mos.ru/newapi")
+        assert adapter._pool_maxsize == 16
+        assert adapter.max_retries.total == 3
+        assert session.get_adapter("https://other.ru")._pool_maxsize == 10
+
+    @pytest.mark.asyncio
+    async def test_arequest_retries(self):
+        """Тест повтора асинхронного запроса при ответе 503"""
+        statuses = iter([503, 200])
+        client = httpx.AsyncClient(
+            transport=httpx.MockTransport(
+                lambda request: httpx.Response(next(statuses))
+            )
+        )
+        with patch("analyze.http_client.settings.HTTP_BACKOFF_FACTOR", 0):
+            response = await arequest("GET", "http://model/", client=client)
+        assert response.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_arequest_post_read_timeout_not_retried(self):
+        """Тест: POST не повторяется после таймаута чтения"""
+        attempts = []
+
+        def handler(request):
+            attempts.append(request)
+            raise httpx.ReadTimeout("timeout", request=request)
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with patch("analyze.http_client.settings.HTTP_BACKOFF_FACTOR", 0):
+            with pytest.raises(httpx.ReadTimeout):
+                await arequest("POST", "http://model/llama", client=client)
+        assert len(attempts) == 1
+
+    @pytest.mark.asyncio
+    async def test_async_client_single_retry_layer(self):
+        """Тест: ошибки соединения повторяет только arequest"""
+        client = build_async_client()
+        transports = [client._transport, *client._mounts.values()]
+        assert all(transport._pool._retries == 0 for transport in transports)
+        await client.aclose()
+
+    def test_llama_prompt_without_answer(self):
+        """Тест: недоступная LLM даёт отрицательный ответ, а не ошибку"""
+        model_requests = ModelRequest("http://model")
+        pair = TwoTextsInput(first="a", second="b")
+        with patch.object(model_requests, "post_request", return_value=None):
+            assert model_requests.llama_prompt(pair) is False
+
+    def test_model_request_timeout(self):
+        """Тест: таймаут сервиса модели не прерывает проверку"""
+        session = MagicMock()
+        session.post.side_effect = requests.ReadTimeout()
+        adapter = build_session().get_adapter("http://model/")
+
+        with patch("analyze.validation.get_session", return_value=session):
+            result = ModelRequest("http://model").post_request("embed", {})
+
+        assert result is None
+        assert "POST" not in adapter.max_retries.allowed_methods
+
+
+# Тесты для ограничителя запросов
+class TestRateLimiter:
+    """Тесты для адаптивного ограничителя запросов к площадке"""
+
+    def test_token_bucket(self):
+        """Тест списания токенов и ожидания при их нехватке"""
+        bucket = TokenBucket("test", rate=1, capacity=2)
+        assert bucket.take() == 0
+        assert bucket.take() == 0
+        assert 0 < bucket.take() <= 1
+
+    def test_adaptive_limiter(self):
+        """Тест снижения и повышения скорости по ответам площадки"""
+        limiter = AdaptiveLimiter(
+            TokenBucket("test", rate=4, capacity=10),
+            min_rate=1,
+            max_rate=5,
+            max_concurrency=8,
+            target_latency=1,
+        )
+        throttled = MagicMock(status_code=429)
+        limiter.call(lambda: throttled)
+        assert limiter.bucket.rate == 2
+        assert limiter.concurrency == 4
+
+        ok = MagicMock(status_code=200)
+        ok.raw.retries.history = ()
+        limiter.call(lambda: ok)
+        assert limiter.bucket.rate == 3
+        assert limiter.concurrency == 4.25
+
+        ok.raw.retries.history = (MagicMock(status=503),)
+        assert limiter.is_throttled(ok) is True
+
+    def test_call_limited_only_for_configured_hosts(self):
+        """Тест: ограничение применяется только к площадке"""
+        assert get_host_limiter("example.com") is None
+        assert get_host_limiter("zakupki.mos.ru") is not None
+        assert call_limited("http://example.com/1", lambda: "ok") == "ok"
+
+    def test_slot_held_while_streaming(self):
+        """Тест: слот занят до конца чтения тела, задержка - до заголовков"""
+        limiter = AdaptiveLimiter(
+            TokenBucket("test", rate=100, capacity=10),
+            min_rate=1,
+            max_rate=100,
+            max_concurrency=1,
+            target_latency=0.05,
+        )
+        response = MagicMock(status_code=200)
+        response.raw.retries.history = ()
+
+        with patch.object(limiter, "record") as record:
+            with limiter.request(lambda: response) as streamed:
+                assert streamed is response
+                assert limiter._active == 1
+                time.sleep(0.1)
+            assert limiter._active == 0
+        throttled, latency = record.call_args[0]
+        assert throttled is False
+        assert latency < 0.05
+
+        with pytest.raises(requests.exceptions.ChunkedEncodingError):
+            with limiter.request(lambda: response):
+                raise requests.exceptions.ChunkedEncodingError()
+        assert limiter.concurrency == 1
+        assert limiter.bucket.rate == 50
+
+    def test_record_outside_condition(self):
+        """Тест: скорость в Redis обновляется без блокировки слотов"""
+        redis_client = MagicMock()
+        bucket = TokenBucket(
+            "test", rate=10, capacity=10, redis_client=redis_client
+        )
+        limiter = AdaptiveLimiter(
+            bucket,
+            min_rate=1,
+            max_rate=100,
+            max_concurrency=4,
+            target_latency=1,
+        )
+        owned = []
+
+        def check(*args):
+            owned.append(limiter._condition._is_owned())
+            return b"10"
+
+        redis_client.hget.side_effect = check
+        redis_client.hset.side_effect = check
+        limiter.record(False, 0.1)
+
+        assert owned == [False, False]
+        redis_client.hset.assert_called_once_with("test", "rate", 11)
+
+    def test_bucket_shared_through_broker_redis(self):
+        """Тест: без RATE_LIMIT_REDIS_URL используется Redis брокера"""
+        with patch(
+            "analyze.rate_limiter.settings.BROKER_URL", "redis://redis:6379/0"
+        ):
+            limiter = get_host_limiter.__wrapped__("zakupki.mos.ru")
+        assert limiter.bucket._redis is not None
+
+        bucket = TokenBucket(
+            "test", rate=1, capacity=1, redis_client=MagicMock()
+        )
+        bucket._take_script = MagicMock(side_effect=redis.ConnectionError())
+        assert bucket.take() == 0
+
+
+# Тесты для кэша метаданных закупок
+class TestAuctionMetadataCache:
+    """Тесты для кэша ответов Auction/Get"""
+
+    @patch("analyze.scraper.get_session")
+    def test_fresh_entry_skips_requests(self, mock_session, mock_page_data):
+        """Тест: свежая запись не требует запросов к площадке"""
+        mock_get = mock_session.return_value.get
+        cache = AuctionMetadataCache(ttl=60, max_age=600)
+        cache.put("123", mock_page_data.model_dump())
+
+        result = ParserWeb(
+            "http://example.com/123", metadata_cache=cache
+        ).fetch_and_parse()
+
+        assert result.name == mock_page_data.name
+        mock_get.assert_not_called()
+
+    @patch("analyze.scraper.get_session")
+    def test_stale_entry_revalidated(self, mock_session, mock_page_data):
+        """Тест: устаревшая запись перепроверяется условным запросом"""
+        mock_get = mock_session.return_value.get
+        cache = AuctionMetadataCache(ttl=0, max_age=600)
+        cache.put("123", mock_page_data.model_dump(), etag='"v1"')
+        mock_get.return_value.status_code = 304
+
+        result = ParserWeb(
+            "http://example.com/123", metadata_cache=cache
+        ).fetch_and_parse()
+
+        assert result.name == mock_page_data.name
+        mock_get.assert_called_once()
+        assert mock_get.call_args.kwargs["headers"] == {
+            "If-None-Match": '"v1"'
+        }
+
+    def test_entry_expires_after_max_age(self, mock_page_data):
+        """Тест удаления записи старше max_age"""
+        cache = AuctionMetadataCache(ttl=0, max_age=0)
+        cache.put("123", mock_page_data.model_dump())
+        assert cache.get("123") is None
+
+
+# Тесты для FilesProcessor
+class TestFilesProcessor:
+    """Тесты для загрузки и разбора файлов"""
+
+    def test_generate_parsed_pages_data_keeps_order(self, mock_page_data):
+        """Тест сохранения порядка файлов при параллельной загрузке"""
+        first = mock_page_data.model_copy(deep=True)
+        first.files = [
+            {"name": f"{i}.pdf", "downloads_link": f"http://a/123/{i}"}
+            for i in range(5)
+        ]
+        first.documents = []
+        second = first.model_copy(deep=True)
+        for file in second.files:
+            file["downloads_link"] = file["downloads_link"].replace(
+                "123", "456"
+            )
+
+        processor = FilesProcessor(max_workers=4, per_host_limit=2)
+        with patch.object(
+            processor,
+            "process_file",
+            side_effect=lambda link, path, file_id, name: (
+                ParsedDocument.from_text(f"{link.split('/')[-2]}:{path.name}")
+            ),
+        ):
+            pages = processor.generate_parsed_pages_data([first, None, second])
+
+        assert pages[1] is None
+        assert pages[0].files_parsed == [f"123:{i}_{i}.pdf" for i in range(5)]
+        assert pages[2].files_parsed == [
+            f"456:{i + 5}_{i}.pdf" for i in range(5)
+        ]
+
+    @patch(
+        "analyze.scraper.parse_stream",
+        return_value=ParsedDocument.from_text("pdf text"),
+    )
+    @patch("analyze.scraper.get_session")
+    def test_process_file_in_memory(
+        self, mock_session, mock_parse_stream, tmp_path
     ):
-        """Тест обработки данных"""
-        mock_parser = MagicMock()
-        mock_parser.fetch_and_parse.return_value = mock_page_data
-        mock_parser_web.return_value = mock_parser
+        """Тест: PDF разбирается из памяти, без записи на диск"""
+        mock_get = mock_session.return_value.get
+        mock_get.return_value.iter_content.return_value = [b"%PDF", b"-1.4"]
+        processor = FilesProcessor(cache=None)
+        assert processor.cache is None
+
+        with patch.object(processor, "download_file") as mock_download:
+            text = processor.process_file(
+                "http://a/1", tmp_path / "0_spec.PDF"
+            )
+
+        assert text.text == "pdf text"
+        mock_download.assert_not_called()
+        stream, extension, file_name = mock_parse_stream.call_args.args
+        assert extension == "pdf"
+        assert file_name == "0_spec.PDF"
+        assert stream.closed
+        assert not any(tmp_path.iterdir())
+
+    def test_scratch_workspace_isolated(self):
+        """Тест: у каждой задачи своя временная директория"""
+        with scratch_workspace() as first, scratch_workspace() as second:
+            assert first != second
+            assert FilesProcessor.scratch_path(first, 0, "../тз.docx") == (
+                first / "0_тз.docx"
+            )
+            (first / "file.pdf").write_bytes(b"data")
+        assert not first.exists() and not second.exists()
+
+    def test_host_limit_shared_per_host(self):
+        """Тест общего ограничения загрузок для одного хоста"""
+        processor = FilesProcessor()
+        assert processor.host_limit("http://a/1") is processor.host_limit(
+            "http://a/2"
+        )
+        assert processor.host_limit("http://a/1") is not (
+            processor.host_limit("http://b/1")
+        )
+
+
+# Тесты для ParsedDocument
+class TestParsedDocument:
+    """Тесты для структуры разобранного документа"""
+
+    def test_role_detection(self):
+        """Тест определения роли по имени файла и началу текста"""
+        assert DocumentRole.detect("ТЗ на поставку.pdf") == (
+            DocumentRole.TECHNICAL_SPECIFICATION
+        )
+        assert DocumentRole.detect("Проект договора.docx") == (
+            DocumentRole.CONTRACT
+        )
+        assert DocumentRole.detect("1.pdf", "техническое задание на") == (
+            DocumentRole.TECHNICAL_SPECIFICATION
+        )
+        assert DocumentRole.detect("1.pdf", "прочее") == DocumentRole.OTHER
+
+    def test_keyword_index(self):
+        """Тест: один проход находит ключевые слова всех валидаторов"""
+        document = ParsedDocument.from_text(
+            "цена лицензии и сертификата стоимостью 100 рублей 01.02.2024 "
+            "срок 30 дней размер обеспечения исполнения контракта составляет"
+        )
+
+        with patch(
+            "analyze.patterns.KEYWORDS", wraps=patterns.KEYWORDS
+        ) as mock_keywords:
+            keywords = document.keywords
+            assert document.keywords is keywords
+        mock_keywords.finditer.assert_called_once()
+
+        assert keywords.words("price") == ["цена", "стоимостью"]
+        assert keywords.words("date") == ["01.02.2024"]
+        assert keywords.words("number") == ["100", "30"]
+        assert keywords.words("days") == ["дней"]
+        assert keywords.has("license") and keywords.has("certificate")
+        assert len(keywords.starts("guarantee")) == 1
+        assert document.mentioned_days == {100, 30, 0}
+        assert document.has_date_between(
+            datetime(2024, 2, 1), datetime(2024, 2, 1, 23)
+        )
+        assert not document.has_date_between(
+            datetime(2024, 2, 2), datetime(2024, 3, 1)
+        )
+
+    def test_mentioned_days_matches_duration_pattern(self):
+        """Тест: множество сроков совпадает с поиском шаблона для каждого N"""
+        texts = [
+            "поставка 130 дней",
+            "в течение 15 календарных дней с даты",
+            "10 рабочих 20 дня",
+            "срок 5 " + "х" * 45 + " дней",
+            "1 день 2 3дня",
+        ]
+        for text in texts:
+            document = ParsedDocument.from_text(text)
+            expected = {
+                days
+                for days in range(200)
+                if re.search(
+                    rf"{days}\s*(?:[^\s\d].{{0,40}})?\s*(дней|дня|день)", text
+                )
+            }
+            assert document.mentioned_days == expected, text
+
+    def test_files_parsed_compatibility(self, mock_page_data):
+        """Тест: данные со списком текстов превращаются в документы"""
+        data = mock_page_data.model_dump()
+        data.pop("documents")
+        data["files"] = [{"name": "ТЗ.pdf"}]
+        data["files_parsed"] = ["текст тз"]
+
+        page_data = KSAttributes(**data)
+
+        assert page_data.documents[0].file_name == "ТЗ.pdf"
+        assert page_data.documents[0].role == (
+            DocumentRole.TECHNICAL_SPECIFICATION
+        )
+        assert page_data.files_parsed == ["текст тз"]
+        assert KSAttributes(**page_data.model_dump()) == page_data
+
+
+# Тесты для хранилища документов
+class TestDocumentStore:
+    """Тесты для передачи документов между задачами по ссылкам"""
+
+    def test_attach_loads_lazily(self, mock_page_data, tmp_path):
+        """Тест: документы читаются из хранилища при обращении"""
+        store = DocumentStore(str(tmp_path / "store.sqlite3"), 60)
+        second = ParsedDocument.from_text("второй", "ТЗ.pdf")
+        mock_page_data.documents.append(second)
+        payload = store.store(mock_page_data).model_dump()
+
+        page_data = store.attach(KSAttributes(**payload))
 
-        mock_processor = MagicMock()
-        mock_processor.generate_parsed_files_data.return_value = mock_page_data
-        mock_files_processor.return_value = mock_processor
+        with patch.object(store, "load", wraps=store.load) as mock_load:
+            assert page_data.documents[1] == second
+            assert page_data.files_parsed[1] == "второй"
+        assert mock_load.call_count == 2
+        assert page_data.documents[0] == mock_page_data.documents[0]
 
-        result = process_data(["http://example.com/123"])
+    def test_expired_documents_removed(self, tmp_path):
+        """Тест: старые документы удаляются при записи"""
+        store = DocumentStore(str(tmp_path / "store.sqlite3"), 60)
+        old = store.put(ParsedDocument.from_text("старый"))
+        later = time.time() + 120
+        with patch("analyze.document_store.time.time", return_value=later):
+            store.put(ParsedDocument.from_text("новый"))
 
-        assert isinstance(result, dict)
-        assert "http://example.com/123" in result
+        assert store.get(old.content_hash) is None
+        with pytest.raises(LookupError):
+            store.load(old)
+
+
+# Тесты для сериализатора Celery
+class TestSerialization:
+    """Тесты для msgpack-сериализатора со сжатием"""
+
+    def test_roundtrip_and_threshold(self, mock_page_data):
+        """Тест: большие сообщения сжимаются, малые передаются как есть"""
+        register_serializer()
+        result = Result(
+            url="u",
+            analysis={
+                ValidationOption.VALIDATE_PRICE: ValidationOptionResult(
+                    status=True, description="numeric"
+                )
+            },
+        ).dict()
+        small = dumps(result)
+        assert small[:1] == PLAIN
+        assert Result(**loads(small)).dict() == result
+
+        page_data = mock_page_data.model_copy(
+            update={"documents": [ParsedDocument.from_text("цена " * 1000)]}
+        )
+        content_type, encoding, data = kombu_dumps(
+            (page_data, [5], "u"), SERIALIZER_NAME
+        )
+        assert data[:1] != PLAIN
+        assert len(data) < 1000
+        args = kombu_loads(data, content_type, encoding)
+        assert KSAttributes(**args[0]) == page_data
+        assert args[1:] == [[5], "u"]
+
+
+# Тесты для кэша разобранных документов
+class TestParsedDocumentCache:
+    """Тесты для кэша извлечённого текста"""
+
+    def test_get_put_link(self, tmp_path):
+        """Тест попаданий по идентификатору файла и по хешу"""
+        cache = ParsedDocumentCache(str(tmp_path / "cache.sqlite3"), 1024)
+        assert cache.get_by_file_id("1") is None
+
+        cache.put("hash1", "text one", "1")
+        assert cache.get_by_file_id("1") == "text one"
+        assert cache.get_by_hash("hash1") == "text one"
+
+        cache.link("2", "hash1")
+        assert cache.get_by_file_id("2") == "text one"
+
+    def test_lru_eviction(self, tmp_path):
+        """Тест вытеснения давно не использованных документов"""
+        cache = ParsedDocumentCache(str(tmp_path / "cache.sqlite3"), 10)
+        cache.put("a", "aaaa", "1")
+        cache.put("b", "bbbb", "2")
+        assert cache.get_by_hash("a") == "aaaa"
+
+        cache.put("c", "cccc", "3")
+
+        assert cache.get_by_hash("b") is None
+        assert cache.get_by_file_id("2") is None
+        assert cache.get_by_hash("a") == "aaaa"
+        assert cache.get_by_hash("c") == "cccc"
+
+    def test_files_processor_cache_hit_skips_download(self, tmp_path):
+        """Тест: при попадании в кэш файл не скачивается и не разбирается"""
+        cache = ParsedDocumentCache(str(tmp_path / "cache.sqlite3"), 1024)
+        cache.put("hash1", "cached text", "42")
+        processor = FilesProcessor(cache=cache)
+
+        with patch.object(processor, "download_file") as mock_download:
+            with patch.object(processor, "parse_file_data") as mock_parse:
+                document = processor.process_file(
+                    "http://a/42", tmp_path / "t.pdf", "42", "тз.pdf"
+                )
+
+        assert document.text == "cached text"
+        assert document.role == DocumentRole.TECHNICAL_SPECIFICATION
+        mock_download.assert_not_called()
+        mock_parse.assert_not_called()
+
+    def test_files_processor_fills_cache(self, tmp_path):
+        """Тест: разобранный документ сохраняется в кэш"""
+        cache = ParsedDocumentCache(str(tmp_path / "cache.sqlite3"), 4096)
+        processor = FilesProcessor(cache=cache)
+        parsed = ParsedDocument(
+            file_name="t.doc", text="a b", page_offsets=[0, 2]
+        )
+
+        with patch.object(processor, "download_file", return_value="h"):
+            with patch.object(
+                processor, "parse_file_data", return_value=parsed
+            ):
+                processor.process_file("http://a/7", tmp_path / "t.doc", "7")
+
+        assert cache.get_by_file_id("7") == parsed.model_dump_json()
+        assert cache.get_by_hash("h") == parsed.model_dump_json()
+        with patch.object(processor, "download_file") as mock_download:
+            document = processor.process_file(
+                "http://a/7", tmp_path / "t.doc", "7"
+            )
+        mock_download.assert_not_called()
+        assert document.pages == ["a", "b"]
+
+
+# Тесты для API utils
+class TestAPIUtils:
+    """Тесты для вспомогательных функций API"""
 
     @patch("sqlalchemy.orm.Session")
     def test_create_new_tasks(self, mock_session, mock_page_data, mock_user):
@@ -295,10 +1433,225 @@ class TestAPIUtils:
         db.commit.assert_called_once()
 
 
+# Тесты для постановки задач анализа
+class TestAnalyzeTasks:
+    """Тесты для цепочки задач загрузки и анализа"""
+
+    @pytest.mark.asyncio
+    @patch("analyze.api.create_new_tasks")
+    @patch("analyze.api.chain")
+    async def test_analyze_url_enqueues_chain(self, mock_chain, mock_create):
+        """Тест: эндпоинт только ставит задачи в очередь"""
+        mock_chain.return_value.apply_async.return_value.id = "task123"
+        request = AnalyzeUrlRequest(
+            urls=["http://example.com/123"],
+            validate_params=[ValidationOption.VALIDATE_PRICE],
+        )
+
+        with patch("analyze.scraper.ingest_url") as mock_ingest:
+            response = await analyze_url(request, db=MagicMock(), token="t")
+            mock_ingest.assert_not_called()
+
+        assert response.task_ids == {"http://example.com/123": "task123"}
+        mock_create.assert_called_once()
+
+    @patch("celery_app.get_document_store")
+    @patch("celery_app.ingest_url")
+    def test_ingest_url_task(
+        self, mock_ingest, mock_get_store, mock_page_data, tmp_path
+    ):
+        """Тест: через брокер передаются ссылки на документы, не тексты"""
+        store = DocumentStore(str(tmp_path / "store.sqlite3"), 60)
+        mock_get_store.return_value = store
+        mock_ingest.return_value = mock_page_data
+
+        result = ingest_url_task("http://example.com/123")
+
+        assert result["documents"] == []
+        assert "Test document content" not in json.dumps(result)
+        ref = KSAttributes(**result).document_refs[0]
+        assert store.load(ref) == mock_page_data.documents[0]
+
+        mock_ingest.return_value = None
+        with pytest.raises(ValueError):
+            ingest_url_task("http://example.com/123")
+
+    @patch("analyze.scraper.FilesProcessor")
+    @patch("analyze.scraper.ParserWeb")
+    def test_ingest_url(
+        self, mock_parser_web, mock_files_processor, mock_page_data
+    ):
+        """Тест загрузки и разбора одной закупки"""
+        mock_parser_web.return_value.fetch_and_parse.return_value = (
+            mock_page_data
+        )
+        processor = mock_files_processor.return_value
+        processor.generate_parsed_files_data.return_value = mock_page_data
+
+        assert ingest_url("http://example.com/123") is mock_page_data
+        processor.generate_parsed_files_data.assert_called_once_with(
+            mock_page_data
+        )
+
+
 # Тесты для utils
 class TestUtils:
     """Тесты для вспомогательных утилит"""
 
+    def test_extract_text_from_xlsx_stream(self):
+        """Тест извлечения текста из XLSX, переданного потоком"""
+        workbook = openpyxl.Workbook()
+        workbook.active.append(["Наименование", "Количество"])
+        workbook.active.append(["Бумага", 10])
+        stream = io.BytesIO()
+        workbook.save(stream)
+        stream.seek(0)
+
+        text = extract_text_from_file(stream, "xlsx")
+        assert "Бумага" in text and "10" in text
+
+    def test_iter_xlsx_rows_limits(self):
+        """Тест ограничения числа строк и ячеек при чтении XLSX"""
+        workbook = openpyxl.Workbook()
+        workbook.active.title = "Спецификация"
+        for index in range(10):
+            workbook.active.append([f"Товар {index}", index, None])
+        stream = io.BytesIO()
+        workbook.save(stream)
+
+        rows = list(iter_xlsx_rows(io.BytesIO(stream.getvalue()), max_rows=3))
+        assert rows == [
+            ("Спецификация", ["Товар 0", "0"]),
+            ("Спецификация", ["Товар 1", "1"]),
+            ("Спецификация", ["Товар 2", "2"]),
+        ]
+        rows = list(iter_xlsx_rows(io.BytesIO(stream.getvalue()), max_cells=5))
+        assert len(rows) == 2
+
+    def test_extract_text_from_pdf_parallel(self):
+        """Тест: страницы из пула процессов склеиваются по порядку"""
+        pages = [f"Page {index}" for index in range(7)]
+        pdf_bytes = make_pdf(pages)
+
+        with patch("analyze.utils.settings.PDF_PAGES_PER_TASK", 2), patch(
+            "analyze.utils.settings.EXTRACTION_MIN_BYTES", 0
+        ):
+            text = extract_text_from_file(io.BytesIO(pdf_bytes), "pdf")
+
+        assert text.split("\n") == pages
+        assert extract_text_from_pdf(io.BytesIO(pdf_bytes)) == text
+
+    def test_open_pdf_closes_previous_file(self, tmp_path):
+        """Тест: процесс пула держит открытым только последний PDF"""
+        first, second = tmp_path / "first.pdf", tmp_path / "second.pdf"
+        first.write_bytes(make_pdf(["First", "Next"]))
+        second.write_bytes(make_pdf(["Second"]))
+
+        assert extract_pdf_pages(str(first), 0, 1) == ["First"]
+        assert extract_pdf_pages(str(first), 1, 2) == ["Next"]
+        first_file = utils._open_pdf_state[2]
+        assert extract_pdf_pages(str(second), 0, 1) == ["Second"]
+
+        assert first_file.closed
+        assert not utils._open_pdf_state[2].closed
+
+    def test_small_file_skips_extraction_pool(self):
+        """Тест: небольшой файл разбирается в текущем процессе"""
+        pdf_bytes = make_pdf(["Page"])
+        pool = MagicMock()
+
+        with patch("analyze.utils.get_extraction_pool", return_value=pool):
+            assert extract_text_from_file(pdf_bytes, "pdf") == "Page"
+
+        pool.map.assert_not_called()
+        pool.submit.assert_not_called()
+
+    def test_shared_file(self, tmp_path):
+        """Тест: поток копируется во временный файл, файл на диске - нет"""
+        stream = io.BytesIO(b"data")
+        with shared_file(stream, ".pdf") as path:
+            assert Path(path).read_bytes() == b"data"
+        assert not Path(path).exists()
+
+        file_path = tmp_path / "spec.pdf"
+        file_path.write_bytes(b"data")
+        with open(file_path, "rb") as file, shared_file(file) as path:
+            assert path == str(file_path)
+        assert file_path.exists()
+
+    def test_extraction_pool_disabled_in_daemon(self):
+        """Тест: в демоническом процессе пул не создаётся"""
+        with patch("analyze.utils.multiprocessing.current_process") as proc:
+            proc.return_value.daemon = True
+            assert get_extraction_pool() is None
+
+    def test_extract_text_from_docx(self):
+        """Тест извлечения текста, таблиц и колонтитулов из DOCX"""
+        row = "<w:tr>{}</w:tr>".format(
+            "".join(
+                f"<w:tc>{docx_paragraph(text)}</w:tc>"
+                for text in ("Бумага", "10")
+            )
+        )
+        docx_bytes = make_docx(
+            docx_paragraph("ТЕХНИЧЕСКОЕ ЗАДАНИЕ")
+            + f"<w:tbl>{row}</w:tbl>"
+            + docx_paragraph("Конец"),
+            header=docx_paragraph("Шапка"),
+            footer=docx_paragraph("Подвал"),
+        )
+
+        text = extract_text_from_file(io.BytesIO(docx_bytes), "docx")
+
+        assert text.split("\n") == [
+            "Шапка",
+            "ТЕХНИЧЕСКОЕ ЗАДАНИЕ",
+            "Бумага | 10",
+            "Конец",
+            "Подвал",
+        ]
+
+    def test_parse_stream_pdf_pages(self):
+        """Тест: ParsedDocument хранит границы страниц PDF"""
+        pdf_bytes = make_pdf(["Page One!", "Page Two"])
+
+        document = parse_stream(io.BytesIO(pdf_bytes), "pdf", "Проект.pdf")
+
+        assert document.text == "page one page two"
+        assert document.pages == ["page one", "page two"]
+        assert document.page_at(document.text.index("two")) == 1
+        assert document.raw_text == "Page One!\nPage Two"
+        assert document.role == DocumentRole.OTHER
+
+    def test_parse_stream_docx_tables(self):
+        """Тест: строки таблиц DOCX сохраняются отдельно"""
+        rows = "".join(
+            "<w:tr>{}</w:tr>".format(
+                "".join(f"<w:tc>{docx_paragraph(cell)}</w:tc>" for cell in row)
+            )
+            for row in (("Наименование", "Кол-во"), ("Бумага", "10"))
+        )
+        docx_bytes = make_docx(
+            docx_paragraph("Техническое задание") + f"<w:tbl>{rows}</w:tbl>"
+        )
+
+        document = parse_stream(io.BytesIO(docx_bytes), "docx", "1.docx")
+
+        assert document.tables == [
+            [["Наименование", "Кол-во"], ["Бумага", "10"]]
+        ]
+        assert document.role == DocumentRole.TECHNICAL_SPECIFICATION
+
+    @patch("analyze.utils.convert_document")
+    def test_read_file_docx_without_conversion(self, mock_convert, tmp_path):
+        """Тест: DOCX читается без LibreOffice"""
+        path = tmp_path / "tz.docx"
+        path.write_bytes(make_docx(docx_paragraph("Текст ТЗ")))
+
+        assert read_file(str(path)) == "текст тз"
+        mock_convert.assert_not_called()
+        assert not path.exists()
+
     def test_clear_text(self):
         """Тест очистки текста"""
         dirty_text = "  Test \n text!@# with 123   "
@@ -1,7 +1,7 @@
 from fastapi import APIRouter
 from model_llama import LLAMA
 from model_sentence_transformers import TransformerC
-from schemas import TwoTextsInput
+from schemas import SimilarityScores, TextsInput, TwoTextsInput
 
 router = APIRouter()
 
@@ -22,6 +22,19 @@ async def llama_prompt(data: TwoTextsInput):
     return {"result": result}
 
 
+@router.post("/similarity")
+async def similarity(data: TwoTextsInput):
+    """Косинусное сходство, евклидово расстояние и скалярное произведение векторов двух текстов за одно кодирование."""
+    scores = model_transformer.similarity(data.first, data.second)
+    return {"result": SimilarityScores(**scores)}
+
+
+@router.post("/embed")
+async def embed(data: TextsInput):
+    """Нормированные векторы пакета текстов с помощью Sentence Transformers."""
+    return {"result": model_transformer.embed(data.texts)}
+
+
 @router.post("/check_similarity_transformer")
 async def check_similarity_transformer(data: TwoTextsInput):
     """Расчет косинусного сходства между двумя текстами с помощью Sentence Transformers."""
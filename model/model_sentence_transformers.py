@@ -85,3 +85,41 @@ class TransformerC:
 
         euclidean_distance = np.linalg.norm(interface_embedding - td_embedding)
         return float(euclidean_distance)
+
+    def embed(self, texts: list) -> list:
+        """
+        Нормированные векторы пакета текстов за один вызов модели.
+
+        Args:
+            texts (list): Тексты; каждый должен укладываться в лимит
+                токенов модели, иначе будет обрезан.
+
+        Returns:
+            list: Векторы единичной длины в виде списков float, их скалярное
+            произведение равно косинусному сходству.
+        """
+        vectors = self.model.encode(
+            texts, batch_size=32, normalize_embeddings=True
+        )
+        return vectors.tolist()
+
+    def similarity(self, first: str, second: str) -> dict:
+        """
+        Все метрики сходства двух строк по одному кодированию каждой.
+
+        Args:
+            first (str): Первая строка.
+            second (str): Вторая строка.
+
+        Returns:
+            dict: Косинусное сходство (cosine), евклидово расстояние
+            (euclidean) и скалярное произведение (dot) векторов.
+        """
+        first_vector, second_vector = self.model.encode([first, second])
+        dot = float(np.dot(first_vector, second_vector))
+        norms = np.linalg.norm(first_vector) * np.linalg.norm(second_vector)
+        return {
+            "cosine": dot / float(norms) if norms else 0.0,
+            "euclidean": float(np.linalg.norm(first_vector - second_vector)),
+            "dot": dot,
+        }
@@ -1,3 +1,5 @@
+from typing import List
+
 from pydantic import BaseModel
 
 
@@ -6,3 +8,17 @@ class TwoTextsInput(BaseModel):
 
     first: str
     second: str
+
+
+class TextsInput(BaseModel):
+    """Схема запроса для пакета текстов для получения векторов."""
+
+    texts: List[str]
+
+
+class SimilarityScores(BaseModel):
+    """Метрики сходства двух текстов по их векторам."""
+
+    cosine: float
+    euclidean: float
+    dot: float